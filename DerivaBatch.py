@@ -0,0 +1,355 @@
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
+import numpy as np
+
+from DerivaEngine import checkpoint, compile_batch, evaluate_batch, sample_grid, split_expressions
+from DerivaExport import write_csv as export_csv
+from DerivaGuard import guard_expression
+from DerivaRender import RECEIPT_GRAPH_BOX, PdfReport, figure_image, pdf_page, plot_figure, receipt_image
+
+# Headless batch runs: evaluate a file of jobs to CSV/NPZ/PNG/receipts or a PDF report without a window
+
+FORMATS = ("csv", "npz", "png", "receipt")
+# File name endings per format
+SUFFIXES = {"csv": ".csv", "npz": ".npz", "png": ".png", "receipt": "-receipt.png"}
+# Columns every job file understands; any other column sets a parameter of the same name
+JOB_COLUMNS = ("name", "expression", "x_min", "x_max", "order", "samples")
+# Jobs with the same expression run together so each worker compiles it once
+CHUNK_SIZE = 16
+
+
+def load_jobs(path):
+    """Read jobs from a CSV file with an expression, x_min and x_max column (order, samples, name optional).
+
+    Lines starting with # are comments. Several functions can share a job the
+    same way as in the app ("sin(x); cos(x)"). A malformed row does not stop
+    the others: its job carries an "error" and is reported as failed without
+    running.
+    """
+    with open(path, newline="") as jobs_file:
+        rows = csv.DictReader(line for line in jobs_file if line.strip() and not line.lstrip().startswith("#"))
+        jobs = []
+        for number, row in enumerate(rows, start=1):
+            row = {key.strip(): (value or "").strip() for key, value in row.items() if key}
+            job = {"index": number, "name": row.get("name") or f"job-{number:04d}",
+                   "expression": row.get("expression", ""), "error": None}
+            try:
+                job.update({
+                    "x_min": float(row["x_min"]),
+                    "x_max": float(row["x_max"]),
+                    "order": int(row.get("order") or 1),
+                    "samples": int(float(row["samples"])) if row.get("samples") else None,
+                    "parameters": {key: float(value) for key, value in row.items()
+                                   if key not in JOB_COLUMNS and value},
+                })
+                validate_job(job)
+            except (KeyError, ValueError) as e:
+                message = f"missing column {e}" if isinstance(e, KeyError) else str(e)
+                job["error"] = ValueError(f"Row {number}: {message}")
+            jobs.append(job)
+    return jobs
+
+
+def validate_job(job):
+    """Raise ValueError for a job the app's Plot button would refuse."""
+    if not split_expressions(job["expression"]):
+        raise ValueError("Function expression cannot be empty")
+    if job["x_min"] >= job["x_max"]:
+        raise ValueError("Min x must be less than Max x")
+    if job["order"] < 1:
+        raise ValueError("Derivative order must be at least 1")
+
+
+def compute_job(job, numeric="balanced", engine="symbolic", checked=False):
+    """Function, derivative and integral for one job, computed the same way as the app's Plot button.
+
+    checked says the expressions already passed guard_expression (see check_jobs).
+    """
+    validate_job(job)
+    expressions = split_expressions(job["expression"])
+    compiled = compile_batch(expressions, checked)
+    parameters = {symbol.name: job["parameters"].get(symbol.name, 1.0) for symbol in compiled.parameters}
+    bound = compiled.bind(parameters)
+    if job["samples"]:
+        x_vals = np.linspace(job["x_min"], job["x_max"], job["samples"])
+    else:
+        x_vals = sample_grid(bound, job["x_min"], job["x_max"], job["order"])
+    x_vals, y_vals, dydx_vals, integral_vals, integral_error = evaluate_batch(
+        bound, x_vals, job["order"], numeric=numeric, engine=engine)
+    return {
+        "expressions": expressions,
+        "parameters": parameters,
+        "x": x_vals,
+        "y": y_vals,
+        "derivative": dydx_vals,
+        "integral": integral_vals,
+        "integral_error": integral_error,
+    }
+
+
+def write_csv(path, job, result):
+    """One x column, then function, derivative and integral columns per expression."""
+    order = job["order"]
+    multiple = len(result["expressions"]) > 1
+    header = ["x_value"]
+    for expr in result["expressions"]:
+        suffix = f"_{expr}" if multiple else ""
+        header += [f"function_{expr}", f"derivative_order_{order}{suffix}", f"integral{suffix}"]
+    columns = np.stack([result["y"], result["derivative"], result["integral"]], axis=1).reshape(-1, result["x"].size)
+    export_csv(path, [result["x"], *columns], header)
+
+
+def write_npz(path, job, result):
+    """All arrays of the job, with the (members, points) curves as stored in the app."""
+    np.savez_compressed(
+        path, x=result["x"], y=result["y"], derivative=result["derivative"], integral=result["integral"],
+        integral_error=result["integral_error"], expressions=np.array(result["expressions"]),
+        order=job["order"], parameter_names=np.array(list(result["parameters"]), dtype=str),
+        parameter_values=np.array(list(result["parameters"].values()), dtype=float))
+
+
+def write_png(path, job, result, dpi=150):
+    """Render the job like the app's light theme, with the Agg backend only."""
+    curves = np.vstack([result["y"], result["derivative"], result["integral"]])
+    plot_figure(result["x"], curves, result["expressions"], job["order"], dpi=dpi).savefig(path, dpi=dpi)
+
+
+def job_receipt(job, result):
+    """The app's receipt for a job, with the graph drawn at its size on the receipt."""
+    curves = np.vstack([result["y"], result["derivative"], result["integral"]])
+    fig = plot_figure(result["x"], curves, result["expressions"], job["order"])
+    graph = figure_image(fig, size=RECEIPT_GRAPH_BOX[2:])
+    return receipt_image(graph, job["expression"], (job["x_min"], job["x_max"]), job["order"])
+
+
+def write_receipt(path, job, result):
+    job_receipt(job, result).save(path)
+
+
+def run_jobs(jobs, out_dir, formats=FORMATS, numeric="balanced", engine="symbolic", dpi=150, checked=False):
+    """Compute and write a list of jobs in this process; returns one report per job.
+
+    A failing job is reported and does not stop the others.
+    """
+    reports = []
+    for job in jobs:
+        start = time.perf_counter()
+        try:
+            result = compute_job(job, numeric, engine, checked)
+            files = []
+            for fmt in formats:
+                path = os.path.join(out_dir, job["name"] + SUFFIXES[fmt])
+                if fmt == "csv":
+                    write_csv(path, job, result)
+                elif fmt == "npz":
+                    write_npz(path, job, result)
+                elif fmt == "receipt":
+                    write_receipt(path, job, result)
+                else:
+                    write_png(path, job, result, dpi)
+                files.append(path)
+            error = None
+        except Exception as e:
+            files, error = [], f"{type(e).__name__}: {e}"
+        reports.append({"index": job["index"], "name": job["name"], "files": files, "error": error,
+                        "seconds": time.perf_counter() - start})
+    return reports
+
+
+def failed_report(job, error, seconds=0.0):
+    return {"index": job["index"], "name": job["name"], "files": [], "error": f"{type(error).__name__}: {error}",
+            "seconds": seconds}
+
+
+def check_jobs(jobs):
+    """Guard every distinct expression once, here in the parent.
+
+    Workers then compile with checked=True instead of each starting a guard
+    process of its own. Returns (jobs that passed, reports of those that did
+    not, including rows load_jobs could not read).
+    """
+    errors = {}
+    passed, failed = [], []
+    for job in jobs:
+        if job.get("error"):
+            failed.append(failed_report(job, job["error"]))
+            continue
+        try:
+            for text in split_expressions(job["expression"]):
+                text = " ".join(text.split())
+                if text not in errors:
+                    try:
+                        guard_expression(text, poll=checkpoint)
+                        errors[text] = None
+                    except ValueError as e:
+                        errors[text] = e
+                if errors[text] is not None:
+                    raise errors[text]
+        except ValueError as e:
+            failed.append(failed_report(job, e))
+            continue
+        passed.append(job)
+    return passed, failed
+
+
+def chunk_jobs(jobs, size=CHUNK_SIZE):
+    """Group jobs by expression (so kernels are compiled once per worker), in chunks of at most size."""
+    groups = {}
+    for job in jobs:
+        groups.setdefault(" ".join(job["expression"].split()), []).append(job)
+    return [group[i:i + size] for group in groups.values() for i in range(0, len(group), size)]
+
+
+def run_batch(jobs, out_dir, formats=FORMATS, workers=None, numeric="balanced", engine="symbolic", dpi=150,
+              report=None):
+    """Spread the jobs over a process pool and return their reports in job order.
+
+    report, if given, is called with each report as it comes in. Cancellable
+    through DerivaEngine.checkpoint when run in a ComputeJob.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    passed, reports = check_jobs(jobs)
+    if report is not None:
+        for item in reports:
+            report(item)
+    chunks = chunk_jobs(passed)
+    workers = min(workers or os.cpu_count() or 1, len(chunks)) or 1
+    if workers == 1:
+        for chunk in chunks:
+            for item in run_jobs(chunk, out_dir, formats, numeric, engine, dpi, True):
+                reports.append(item)
+                if report is not None:
+                    report(item)
+            checkpoint(f"{len(reports)} of {len(jobs)} jobs", len(reports) / len(jobs))
+    else:
+        # spawn keeps the workers independent of whatever the parent has open
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(run_jobs, chunk, out_dir, formats, numeric, engine, dpi, True)
+                       for chunk in chunks]
+            for future in as_completed(futures):
+                for item in future.result():
+                    reports.append(item)
+                    if report is not None:
+                        report(item)
+                checkpoint(f"{len(reports)} of {len(jobs)} jobs", len(reports) / len(jobs))
+    return sorted(reports, key=lambda item: item["index"])
+
+
+def report_page(job, numeric="balanced", engine="symbolic", checked=False):
+    """A job's receipt as a compressed PDF page, and its report (runs in a worker process).
+
+    The page is None when the job fails.
+    """
+    start = time.perf_counter()
+    try:
+        page = pdf_page(job_receipt(job, compute_job(job, numeric, engine, checked)))
+    except Exception as e:
+        return failed_report(job, e, time.perf_counter() - start), None
+    return {"index": job["index"], "name": job["name"], "files": [], "error": None,
+            "seconds": time.perf_counter() - start}, page
+
+
+def report_pages(jobs, workers=1, numeric="balanced", engine="symbolic"):
+    """(report, page) for each job in job order, rendered by a process pool.
+
+    The jobs must have passed check_jobs. Only a couple of pages per worker
+    are submitted ahead of the one being written, so memory stays bounded
+    however many jobs there are.
+    """
+    if workers == 1:
+        for job in jobs:
+            yield report_page(job, numeric, engine, True)
+        return
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = deque(executor.submit(report_page, job, numeric, engine, True) for job in islice(jobs, 2 * workers))
+        try:
+            while pending:
+                item = pending.popleft().result()
+                for job in islice(jobs, 1):
+                    pending.append(executor.submit(report_page, job, numeric, engine, True))
+                yield item
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def write_report(jobs, path, workers=None, numeric="balanced", engine="symbolic", report=None):
+    """Write one receipt page per job into a single PDF, in job order, as the pages finish.
+
+    Failed jobs get no page. report works as in run_batch; cancellable the
+    same way (the pages written so far still make a valid PDF). Returns the
+    reports in job order.
+    """
+    passed, reports = check_jobs(jobs)
+    if report is not None:
+        for item in reports:
+            report(item)
+    workers = min(workers or os.cpu_count() or 1, len(passed)) or 1
+    with PdfReport(path) as pdf:
+        for item, page in report_pages(passed, workers, numeric, engine):
+            if page is not None:
+                pdf.add_page(page)
+                item["files"] = [path]
+            reports.append(item)
+            if report is not None:
+                report(item)
+            checkpoint(f"{len(reports)} of {len(jobs)} jobs", len(reports) / len(jobs))
+    return sorted(reports, key=lambda item: item["index"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Evaluate functions, derivatives and integrals for a file of jobs, without a window.",
+        epilog="The job file is a CSV with the columns expression, x_min, x_max and optionally order, "
+               "samples (blank for adaptive sampling) and name; any other column sets the parameter "
+               "of the same name, e.g. a column 'a' for a*sin(x).")
+    parser.add_argument("jobs", help="CSV file of jobs")
+    parser.add_argument("-o", "--out", default="deriva-output", help="output directory (default: %(default)s)")
+    parser.add_argument("-f", "--format", nargs="+", choices=FORMATS, default=None, dest="formats",
+                        help="files to write per job (default: csv, or none with --report)")
+    parser.add_argument("--report", metavar="PDF", help="also write every job's receipt as a page of this PDF")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--numeric", choices=["fast", "balanced", "accurate"], default="balanced",
+                        help="numeric derivative preset (default: %(default)s)")
+    parser.add_argument("--engine", choices=["symbolic", "chebyshev", "autodiff"], default="symbolic",
+                        help="derivative/integral engine (default: %(default)s)")
+    parser.add_argument("--dpi", type=int, default=150, help="PNG resolution (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    jobs = load_jobs(args.jobs)
+    start = time.perf_counter()
+    done = [0]
+
+    def report(item):
+        done[0] += 1
+        status = item["error"] or ", ".join(os.path.basename(path) for path in item["files"])
+        print(f"[{done[0]}/{len(jobs)}] {item['name']}: {status} ({item['seconds']:.2f} s)", flush=True)
+
+    failed = 0
+    formats = args.formats or ([] if args.report else ["csv"])
+    if formats:
+        reports = run_batch(jobs, args.out, formats, args.workers, args.numeric, args.engine, args.dpi, report)
+        failed = sum(item["error"] is not None for item in reports)
+        print(f"{len(jobs) - failed} of {len(jobs)} jobs written to {args.out} in {time.perf_counter() - start:.1f} s")
+    if args.report:
+        done[0] = 0
+        start = time.perf_counter()
+        reports = write_report(jobs, args.report, args.workers, args.numeric, args.engine, report)
+        pages = sum(item["error"] is None for item in reports)
+        failed = max(failed, len(jobs) - pages)
+        print(f"{pages} of {len(jobs)} receipts written to {args.report} in {time.perf_counter() - start:.1f} s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import numpy as np
+from numpy.polynomial import chebyshev as C
+
+# Chebyshev-series representation of smooth functions (in the style of chebfun)
+
+MIN_DEGREE = 16
+MAX_DEGREE = 2**16
+# Relative size of the trailing coefficients at which the series has converged
+TOLERANCE = 100 * np.finfo(float).eps
+
+
+def chebyshev_points(n, a=-1.0, b=1.0):
+    """The n + 1 Chebyshev points of the second kind on [a, b], from b down to a."""
+    t = np.cos(np.pi * np.arange(n + 1) / n)
+    return 0.5 * (a + b) + 0.5 * (b - a) * t
+
+
+def values_to_coeffs(values):
+    """Chebyshev coefficients from values at chebyshev_points, through one real FFT."""
+    n = values.size - 1
+    # Even extension turns the cosine transform (DCT-I) into an FFT
+    extended = np.concatenate([values, values[-2:0:-1]])
+    coeffs = np.real(np.fft.rfft(extended))[:n + 1] / n
+    coeffs[0] /= 2
+    coeffs[n] /= 2
+    return coeffs
+
+
+class ChebyshevSeries:
+    """A function on [a, b] held as Chebyshev coefficients.
+
+    Derivatives and integrals are exact operations on the coefficients, and
+    the series can be evaluated at any resolution afterwards.
+    """
+
+    def __init__(self, coeffs, a, b, error=0.0):
+        self.coeffs = np.asarray(coeffs, dtype=float)
+        self.a = float(a)
+        self.b = float(b)
+        self.error = error
+
+    @classmethod
+    def fit(cls, f, a, b, tolerance=TOLERANCE, max_degree=MAX_DEGREE):
+        """Sample f at doubling numbers of Chebyshev points until the coefficients die out.
+
+        Returns None when f is not smooth enough (or not finite) on [a, b] to
+        converge within max_degree.
+        """
+        n = MIN_DEGREE
+        while n <= max_degree:
+            with np.errstate(all="ignore"):
+                values = np.broadcast_to(np.asarray(f(chebyshev_points(n, a, b)), dtype=float), (n + 1,))
+            if not np.all(np.isfinite(values)):
+                return None
+
+            coeffs = values_to_coeffs(values)
+            scale = np.max(np.abs(coeffs)) or 1.0
+            tail = np.max(np.abs(coeffs[-max(4, n // 8):]))
+            if tail <= tolerance * scale:
+                # Chop the negligible tail but keep what it was worth as the error
+                keep = np.flatnonzero(np.abs(coeffs) > tolerance * scale)
+                size = keep[-1] + 1 if keep.size else 1
+                return cls(coeffs[:size], a, b, error=np.sum(np.abs(coeffs[size:])))
+            n *= 2
+        return None
+
+    def _to_unit(self, x_vals):
+        return (2 * np.asarray(x_vals, dtype=float) - (self.a + self.b)) / (self.b - self.a)
+
+    def __call__(self, x_vals):
+        return C.chebval(self._to_unit(x_vals), self.coeffs)
+
+    def derivative(self, order=1):
+        """The order-th derivative as another series."""
+        if order == 0:
+            return self
+        coeffs = C.chebder(self.coeffs, order, scl=2 / (self.b - self.a)) if self.coeffs.size > order else [0.0]
+        return ChebyshevSeries(coeffs, self.a, self.b)
+
+    def integral(self):
+        """The integral from a to x as another series."""
+        coeffs = C.chebint(self.coeffs, lbnd=-1, scl=(self.b - self.a) / 2)
+        return ChebyshevSeries(coeffs, self.a, self.b, error=self.error * (self.b - self.a))
@@ -0,0 +1,1188 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import sympy as sp
+
+from DerivaAutodiff import taylor_derivative
+from DerivaChebyshev import ChebyshevSeries
+from DerivaGuard import GuardError, guard_expression, limited
+from DerivaNumeric import NUMERIC_PRESETS, numeric_derivative
+from DerivaSampling import INITIAL_POINTS, MAX_POINTS, adaptive_samples, even_picks
+
+# Shared computation engine for the DerivaPlot apps
+
+x = sp.Symbol('x', real=True)
+
+SYMPY_LOCALS = {"x": x, "sin": sp.sin, "cos": sp.cos, "tan": sp.tan,
+                "exp": sp.exp, "log": sp.log, "sqrt": sp.sqrt,
+                "pi": sp.pi, "e": sp.E}
+
+# Give up on symbolic differentiation past these limits (seconds per order in the guard's
+# worker, size of the result) and go numeric instead
+DIFF_TIME_BUDGET = 2.0
+DIFF_MAX_OPS = 20000
+# Only try a closed-form antiderivative for reasonably small integrands
+INTEGRATE_MAX_OPS = 60
+# Seconds SymPy gets (in the guard's worker) to integrate, and to look for singularities
+INTEGRATE_TIME_BUDGET = 2.0
+POLE_TIME_BUDGET = 5.0
+# Grids denser than this are integrated straight from the samples
+DENSE_SAMPLES = 200000
+# A step this many times steeper than its neighbours counts as a discontinuity
+JUMP_RATIO = 50.0
+# A sign change is a pole when |f| grows this much from each of these distances (as fractions
+# of its sample interval) to the next
+POLE_GROWTH = 10.0
+POLE_PROBES = (1e-2, 1e-4, 1e-6)
+
+
+# Gauss-Kronrod 7/15 rule on [-1, 1] (same constants as QUADPACK's qk15)
+_XGK = np.array([
+    0.991455371120812639206854697526329,
+    0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926,
+    0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013,
+    0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245,
+    0.000000000000000000000000000000000,
+])
+_WGK = np.array([
+    0.022935322010529224963732008058970,
+    0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518,
+    0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550,
+    0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649,
+    0.209482141084727828012999174891714,
+])
+_WG = np.array([
+    0.129484966168869693270611432679082,
+    0.279705391489276667901467771423780,
+    0.381830050505118944950369775488975,
+    0.417959183673469387755102040816327,
+])
+
+KRONROD_NODES = np.concatenate([-_XGK[:-1], _XGK[::-1]])
+KRONROD_WEIGHTS = np.concatenate([_WGK[:-1], _WGK[::-1]])
+# The 7 Gauss nodes sit at the odd positions of the 15 Kronrod nodes
+GAUSS_WEIGHTS = np.concatenate([_WG[:-1], _WG[::-1]])
+
+
+class Cancelled(Exception):
+    """Raised inside a computation whose job has been cancelled."""
+
+
+class ComputeJob:
+    """Cancellation flag and progress report shared between a worker thread and the UI.
+
+    Python threads cannot be killed, so long computations call checkpoint()
+    between steps; it raises Cancelled once the job has been cancelled.
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self.stage = "Starting"
+        self.fraction = 0.0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self, function, *args, **kwargs):
+        """Call function with this job as the current job of the calling thread."""
+        _current.job = self
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _current.job = None
+
+
+_current = threading.local()
+
+
+def checkpoint(stage=None, fraction=None):
+    """Record progress for the current thread's job and raise Cancelled if it was cancelled.
+
+    Does nothing outside ComputeJob.run, so the engine works the same without a job.
+    """
+    job = getattr(_current, "job", None)
+    if job is None:
+        return
+    if stage is not None:
+        job.stage, job.fraction = stage, 0.0
+    if fraction is not None:
+        job.fraction = fraction
+    if job.cancelled:
+        raise Cancelled()
+
+
+def evaluate(f, x_vals):
+    """Evaluate f on an array and always return a float array of the same shape."""
+    x_vals = np.asarray(x_vals, dtype=float)
+    with np.errstate(all="ignore"):
+        y_vals = f(x_vals)
+    return as_samples(y_vals, x_vals)
+
+
+def as_samples(y_vals, x_vals):
+    """Coerce kernel output (scalar, complex, ...) into a real float array shaped like x_vals.
+
+    A stack of curves (extra leading axes) keeps its leading axes.
+    """
+    y_vals = np.asarray(y_vals)
+    if np.iscomplexobj(y_vals):
+        # Complex results only show up outside the real domain (e.g. sqrt(-1))
+        y_vals = np.where(np.imag(y_vals) == 0, np.real(y_vals), np.nan)
+    shape = x_vals.shape
+    if x_vals.ndim and y_vals.ndim > x_vals.ndim:
+        shape = y_vals.shape[:-x_vals.ndim] + shape
+    return np.broadcast_to(y_vals.astype(float, copy=False), shape).copy()
+
+
+def gauss_kronrod(f, a, b):
+    """Integrate f over every interval [a[i], b[i]] with one vectorized 15-point pass.
+
+    When f returns a (curves, points) stack the results have one row per curve.
+    """
+    center = 0.5 * (a + b)
+    half = 0.5 * (b - a)
+    nodes = center[:, None] + half[:, None] * KRONROD_NODES[None, :]
+    y_vals = evaluate(f, nodes.ravel())
+    y_vals = y_vals.reshape(y_vals.shape[:-1] + nodes.shape)
+
+    # Intervals touching a pole give inf - inf here, which the callers treat as unresolved
+    with np.errstate(all="ignore"):
+        kronrod = half * (y_vals @ KRONROD_WEIGHTS)
+        gauss = half * (y_vals[..., 1::2] @ GAUSS_WEIGHTS)
+        error = np.abs(kronrod - gauss)
+    return kronrod, error
+
+
+def interval_integrals(f, x_vals, epsabs=1.49e-8, epsrel=1.49e-8, max_depth=12):
+    """Integrate f over every interval of the grid, returning (area, error) per interval.
+
+    Each interval is integrated once with Gauss-Kronrod 7/15 and bisected
+    while its error estimate is too large. f may return a (curves, points)
+    stack; all curves then share the evaluations and the result has one row
+    per curve.
+    """
+    x_vals = np.asarray(x_vals, dtype=float)
+    n_intervals = max(x_vals.size - 1, 0)
+    a, b = x_vals[:-1], x_vals[1:]
+    owner = np.arange(n_intervals)
+    span = abs(x_vals[-1] - x_vals[0]) if x_vals.size else 1.0
+    span = span or 1.0
+
+    area = error = pending = None
+    for depth in range(max_depth + 1):
+        checkpoint()
+        piece, piece_error = gauss_kronrod(f, a, b)
+        if area is None:
+            stack_shape = piece.shape[:-1]
+            area = np.zeros((int(np.prod(stack_shape)), n_intervals))
+            error = np.zeros_like(area)
+            pending = np.ones((area.shape[0], a.size), dtype=bool)
+        piece = piece.reshape(pending.shape)
+        piece_error = piece_error.reshape(pending.shape)
+
+        # Share the absolute tolerance out by interval width
+        tolerance = np.maximum(epsabs * np.abs(b - a) / span, epsrel * np.abs(piece))
+        done = (piece_error <= tolerance) | ~np.isfinite(piece_error)
+        if depth == max_depth:
+            done[:] = True
+
+        rows, cols = np.nonzero(pending & done)
+        np.add.at(area, (rows, owner[cols]), piece[rows, cols])
+        np.add.at(error, (rows, owner[cols]), piece_error[rows, cols])
+        pending &= ~done
+        keep = pending.any(axis=0)
+        if not keep.any():
+            break
+
+        # Curves that already converged on an interval stop collecting its halves
+        a, b, owner, pending = a[keep], b[keep], owner[keep], pending[:, keep]
+        middle = 0.5 * (a + b)
+        a, b = np.concatenate([a, middle]), np.concatenate([middle, b])
+        owner = np.concatenate([owner, owner])
+        pending = np.concatenate([pending, pending], axis=1)
+
+    if area is None:
+        return np.zeros(0), np.zeros(0)
+    return area.reshape(stack_shape + (n_intervals,)), error.reshape(stack_shape + (n_intervals,))
+
+
+def cumulative_integral(f, x_vals, lower=None, epsabs=1.49e-8, epsrel=1.49e-8, max_depth=12):
+    """Integrate f from x_vals[0] (or from lower) to every point of x_vals.
+
+    The interval_integrals pieces are prefix-summed. Returns the integral
+    values and a per-point error estimate.
+    """
+    x_vals = np.asarray(x_vals, dtype=float)
+    if x_vals.size == 0:
+        return np.zeros(0), np.zeros(0)
+
+    area, error = interval_integrals(f, x_vals, epsabs, epsrel, max_depth)
+    integral_vals = np.concatenate([[0.0], np.cumsum(area)])
+    error_vals = np.concatenate([[0.0], np.cumsum(error)])
+
+    if lower is not None and x_vals.size and lower != x_vals[0]:
+        # Shift so the integral is measured from lower instead of the left edge
+        offset, offset_error = cumulative_integral(f, [lower, x_vals[0]], epsabs=epsabs,
+                                                   epsrel=epsrel, max_depth=max_depth)
+        integral_vals += offset[-1]
+        error_vals += offset_error[-1]
+
+    return integral_vals, error_vals
+
+
+def parse_expression(expr):
+    """Parse a user expression string into a SymPy expression in x."""
+    return sp.sympify(expr, locals=SYMPY_LOCALS)
+
+
+def expression_parameters(sympy_expr):
+    """Free symbols other than x (e.g. a, b, c in a*sin(b*x) + c), sorted by name."""
+    return tuple(sorted(sympy_expr.free_symbols - {x}, key=lambda symbol: symbol.name))
+
+
+def lambdify_expression(sympy_expr, parameters=()):
+    """Turn a SymPy expression in x into a NumPy-evaluable function f(x, *parameters)."""
+    # SciPy first so special functions from antiderivatives (erf, Si, ...) stay vectorized
+    return sp.lambdify((x, *parameters), sympy_expr, ['scipy', 'numpy'])
+
+
+@lru_cache(maxsize=256)
+def derivative_expression(sympy_expr, order):
+    """Differentiate symbolically to the given order, or return None if that is too slow or impossible.
+
+    Each order gets DIFF_TIME_BUDGET seconds in the guard's worker, which is
+    killed when SymPy runs over.
+    """
+    if order == 0:
+        return sympy_expr
+
+    # Build on the previous order so asking for 5 then 6 only differentiates once more
+    previous = derivative_expression(sympy_expr, order - 1)
+    if previous is None:
+        return None
+    checkpoint()
+    try:
+        return limited(_differentiate, previous, timeout=DIFF_TIME_BUDGET, poll=checkpoint)
+    except GuardError:
+        return None
+
+
+def _differentiate(sympy_expr):
+    """One more sp.diff, or None when SymPy can't do it or the result is too big (runs in the guard's worker)."""
+    try:
+        result = sp.diff(sympy_expr, x)
+    except Exception:
+        return None
+
+    # Point masses from differentiating abs/Heaviside are zero everywhere we sample
+    result = result.replace(sp.DiracDelta, lambda *args: sp.S.Zero)
+    if result.has(sp.Derivative, sp.Subs):
+        # SymPy could not evaluate it (e.g. an undefined function)
+        return None
+    if sp.count_ops(result) > DIFF_MAX_OPS:
+        return None
+    return result
+
+
+@lru_cache(maxsize=256)
+def compiles_to_numpy(sympy_expr):
+    """Check that an expression lambdifies to something NumPy/SciPy can evaluate on arrays."""
+    parameters = expression_parameters(sympy_expr)
+    try:
+        function = lambdify_expression(sympy_expr, parameters)
+        evaluate(lambda x_vals: function(x_vals, *[1.0] * len(parameters)), np.linspace(-1.0, 1.0, 3))
+    except Exception:
+        return False
+    return True
+
+
+def derivative_kernel(sympy_expr, order, parameters=()):
+    """Lambdify the order-th symbolic derivative; None means use a numeric fallback."""
+    d_expr = derivative_expression(sympy_expr, order)
+    if d_expr is None or not compiles_to_numpy(d_expr):
+        return None
+    return lambdify_expression(d_expr, parameters)
+
+
+def antiderivative_expression(sympy_expr):
+    """Find a closed-form antiderivative, or None when SymPy cannot find one cheaply."""
+    if sp.count_ops(sympy_expr) > INTEGRATE_MAX_OPS:
+        return None
+    try:
+        return limited(_integrate, sympy_expr, timeout=INTEGRATE_TIME_BUDGET, poll=checkpoint)
+    except GuardError:
+        # Too slow or too big: the integral is done numerically instead
+        return None
+
+
+def _integrate(sympy_expr):
+    """sp.integrate, or None when it finds no closed form (runs in the guard's worker)."""
+    try:
+        result = sp.integrate(sympy_expr, x, manual=True)
+    except Exception:
+        return None
+    if result.has(sp.Integral):
+        return None
+    return result
+
+
+def batch_kernel(exprs, parameters=()):
+    """Compile a list of expressions (None entries allowed) into one NumPy function sharing common subexpressions.
+
+    The function takes (x_vals, *parameter_values) and returns a list of
+    sample arrays in the same order, with None wherever the input was None.
+    Parameter values may be arrays that broadcast against x_vals, which adds
+    leading axes to the results.
+    """
+    parts = [part for part in exprs if part is not None]
+    # cse=True runs the expressions through sp.cse so e.g. exp(-x**2) is computed once
+    kernel = sp.lambdify((x, *parameters), parts, ['scipy', 'numpy'], cse=True)
+
+    def batched(x_vals, *values):
+        x_vals = np.asarray(x_vals, dtype=float)
+        with np.errstate(all="ignore"):
+            results = list(kernel(x_vals, *values))
+        return [None if part is None else as_samples(results.pop(0), x_vals) for part in exprs]
+
+    return batched
+
+
+def fused_kernel(sympy_expr, d_expr=None, F_expr=None, parameters=()):
+    """Compile f, f^(n) and F into one NumPy function that shares common subexpressions."""
+    kernel = batch_kernel([sympy_expr, d_expr, F_expr], parameters)
+    return lambda x_vals, *values: tuple(kernel(x_vals, *values))
+
+
+class CompiledExpression:
+    """A parsed expression together with its compiled NumPy kernels."""
+
+    def __init__(self, sympy_expr):
+        self.expr = sympy_expr
+        self.key = sp.srepr(sympy_expr)
+        # Kernels take the parameter values after x; bind() fixes them
+        self.parameters = expression_parameters(sympy_expr)
+        self.function = lambdify_expression(sympy_expr, self.parameters)
+        self._derivatives = {}
+        self._fused = {}
+        self._chebyshev = OrderedDict()
+        self._antiderivative = None
+        self._antiderivative_expr = None
+        self._antiderivative_tried = False
+
+    def derivative(self, order):
+        """Compiled order-th derivative, or None when only a numeric derivative is possible."""
+        if order not in self._derivatives:
+            self._derivatives[order] = derivative_kernel(self.expr, order, self.parameters)
+        return self._derivatives[order]
+
+    def antiderivative_expr(self):
+        """Closed-form antiderivative that compiles to NumPy/SciPy, or None when there is none."""
+        if not self._antiderivative_tried:
+            F_expr = antiderivative_expression(self.expr)
+            if F_expr is not None and not compiles_to_numpy(F_expr):
+                # Some special functions have no vectorized NumPy/SciPy form
+                F_expr = None
+            self._antiderivative_expr = F_expr
+            self._antiderivative_tried = True
+        return self._antiderivative_expr
+
+    def antiderivative(self):
+        """Compiled closed-form antiderivative, or None when there is none."""
+        if self._antiderivative is None and self.antiderivative_expr() is not None:
+            self._antiderivative = lambdify_expression(self._antiderivative_expr, self.parameters)
+        return self._antiderivative
+
+    def chebyshev(self, a, b):
+        """Chebyshev series of f on [a, b], or None when f is not smooth there (a few ranges are kept)."""
+        key = (float(a), float(b))
+        if key not in self._chebyshev:
+            self._chebyshev[key] = ChebyshevSeries.fit(self.function, a, b)
+            while len(self._chebyshev) > 8:
+                self._chebyshev.popitem(last=False)
+        return self._chebyshev[key]
+
+    def derivative_expr(self, order):
+        """Closed-form order-th derivative that compiles to NumPy/SciPy, or None when there is none."""
+        d_expr = derivative_expression(self.expr, order)
+        if d_expr is not None and not compiles_to_numpy(d_expr):
+            return None
+        return d_expr
+
+    def fused(self, order):
+        """One kernel returning f, its order-th derivative and its antiderivative in a single pass.
+
+        The derivative or antiderivative comes back as None when no closed form exists.
+        """
+        if order not in self._fused:
+            self._fused[order] = fused_kernel(self.expr, self.derivative_expr(order), self.antiderivative_expr(),
+                                              self.parameters)
+        return self._fused[order]
+
+    def bind(self, values):
+        """This expression with its parameters fixed from a {name: value} dict (itself when it has none)."""
+        if not self.parameters:
+            return self
+        return BoundExpression(self, values)
+
+
+class BoundExpression:
+    """A parametric CompiledExpression with fixed parameter values.
+
+    It reuses the parent's kernels, so moving a parameter never recompiles.
+    """
+
+    def __init__(self, parent, values):
+        self.parent = parent
+        self.parameters = ()
+        self.values = tuple(float(values[symbol.name]) for symbol in parent.parameters)
+        self.expr = parent.expr.xreplace(dict(zip(parent.parameters, map(sp.Float, self.values))))
+        self.key = (parent.key, self.values)
+        self.function = lambda x_vals: parent.function(x_vals, *self.values)
+
+    def derivative_expr(self, order):
+        return self.parent.derivative_expr(order)
+
+    def antiderivative_expr(self):
+        return self.parent.antiderivative_expr()
+
+    def chebyshev(self, a, b):
+        """Chebyshev series of f on [a, b] for these values, or None when f is not smooth there."""
+        return ChebyshevSeries.fit(self.function, a, b)
+
+    def fused(self, order):
+        kernel = self.parent.fused(order)
+        return lambda x_vals: kernel(x_vals, *self.values)
+
+    def bind(self, values):
+        return self.parent.bind(values)
+
+
+class CompiledBatch:
+    """Several compiled expressions that are always evaluated together on one shared grid."""
+
+    def __init__(self, members):
+        self.members = tuple(members)
+        # Union of the members' parameters; every kernel takes all of them
+        self.parameters = expression_parameters(sp.Tuple(*[m.expr for m in self.members]))
+        kernel = batch_kernel([m.expr for m in self.members], self.parameters)
+        self.function = lambda x_vals, *values: _stack(kernel(x_vals, *values))
+        self._fused = {}
+        self._subsets = {}
+
+    def __len__(self):
+        return len(self.members)
+
+    def closed_forms(self, order):
+        """Lists of the members' closed-form derivatives and antiderivatives (None where there is none)."""
+        return ([m.derivative_expr(order) for m in self.members],
+                [m.antiderivative_expr() for m in self.members])
+
+    def fused(self, order):
+        """One kernel returning f, f^(n) and F for every member as stacked (members, points) arrays.
+
+        Rows without a closed form are NaN; closed_forms tells which they are.
+        """
+        if order not in self._fused:
+            d_exprs, F_exprs = self.closed_forms(order)
+            kernel = batch_kernel([m.expr for m in self.members] + d_exprs + F_exprs, self.parameters)
+
+            def fused(x_vals, *values):
+                x_vals = np.asarray(x_vals, dtype=float)
+                rows = [np.full(x_vals.shape, np.nan) if row is None else row for row in kernel(x_vals, *values)]
+                n = len(self.members)
+                return _stack(rows[:n]), _stack(rows[n:2 * n]), _stack(rows[2 * n:])
+
+            self._fused[order] = fused
+        return self._fused[order]
+
+    def subset(self, rows):
+        """The batch of just the given member indices (kept, so its kernels compile once)."""
+        rows = tuple(rows)
+        if rows not in self._subsets:
+            self._subsets[rows] = CompiledBatch(self.members[i] for i in rows)
+        return self._subsets[rows]
+
+    def bind(self, values):
+        """This batch with its parameters fixed from a {name: value} dict (itself when it has none)."""
+        if not self.parameters:
+            return self
+        return BoundBatch(self, values)
+
+
+class BoundBatch:
+    """A parametric CompiledBatch with fixed parameter values, reusing the parent's kernels."""
+
+    def __init__(self, parent, values):
+        self.parent = parent
+        self.parameters = ()
+        self.named_values = dict(values)
+        self.values = tuple(float(values[symbol.name]) for symbol in parent.parameters)
+        self.members = tuple(member.bind(values) for member in parent.members)
+        self.function = lambda x_vals: parent.function(x_vals, *self.values)
+
+    def __len__(self):
+        return len(self.members)
+
+    def closed_forms(self, order):
+        return self.parent.closed_forms(order)
+
+    def fused(self, order):
+        kernel = self.parent.fused(order)
+        return lambda x_vals: kernel(x_vals, *self.values)
+
+    def subset(self, rows):
+        return self.parent.subset(rows).bind(self.named_values)
+
+    def bind(self, values):
+        return self.parent.bind(values)
+
+
+def _stack(rows):
+    """Stack kernel outputs into one array; rows that do not depend on a swept parameter are broadcast."""
+    return np.stack(np.broadcast_arrays(*rows))
+
+
+class CompileCache:
+    """Process-wide LRU cache of compiled expressions keyed on their canonical SymPy form."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # canonical key -> CompiledExpression
+        self._aliases = OrderedDict()  # input text -> canonical key
+        self._lock = threading.Lock()
+
+    def get(self, text, checked=False):
+        """Return the compiled entry for an expression string, compiling it on a miss.
+
+        checked says the text already passed guard_expression (in this process
+        or the one that handed it over), so a miss skips the guard.
+        """
+        text = " ".join(str(text).split())
+
+        # Text we have seen before skips SymPy entirely
+        with self._lock:
+            key = self._aliases.get(text)
+            if key in self._entries:
+                self._aliases.move_to_end(text)
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        # New spelling: make sure SymPy can digest it in bounded time and memory,
+        # parse it, then reuse the entry if it is the same expression
+        if not checked:
+            guard_expression(text, poll=checkpoint)
+        sympy_expr = parse_expression(text)
+        key = sp.srepr(sympy_expr)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = CompiledExpression(sympy_expr)
+
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                entry = self._entries[key]
+            else:
+                self.misses += 1
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._aliases[text] = key
+            self._aliases.move_to_end(text)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            while len(self._aliases) > 4 * self.maxsize:
+                self._aliases.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+
+
+COMPILE_CACHE = CompileCache()
+
+
+def compile_expression(text, checked=False):
+    """Parse and compile an expression string through the shared compile cache."""
+    return COMPILE_CACHE.get(text, checked)
+
+
+def split_expressions(text):
+    """Split "sin(x); cos(x)" or "sin(x), cos(x)" into separate expressions (commas inside brackets stay)."""
+    parts, depth, current = [], 0, []
+    for char in str(text):
+        if char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        if char == ";" or (char == "," and depth == 0):
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+@lru_cache(maxsize=32)
+def _compiled_batch(members):
+    return CompiledBatch(members)
+
+
+def compile_batch(texts, checked=False):
+    """Compile several expression strings into one batch; members come from the compile cache."""
+    return _compiled_batch(tuple(compile_expression(text, checked) for text in texts))
+
+
+def gradient_derivative(y_vals, x_vals, order=1):
+    """Numeric derivative of sampled data (no callable) by repeated np.gradient."""
+    result = y_vals
+    for _ in range(order):
+        result = np.gradient(result, x_vals)
+    return result
+
+
+def fallback_derivative(f, x_vals, order=1, numeric="balanced"):
+    """Derivative without a symbolic formula: exact Taylor-mode AD, or the numeric preset when f uses an unsupported function."""
+    try:
+        return as_samples(taylor_derivative(f, x_vals, order), x_vals)
+    except Exception:
+        return numeric_derivative(f, x_vals, order, **NUMERIC_PRESETS[numeric])
+
+
+def trapezoid_error(x_vals, y_vals):
+    """Per-interval trapezoid rule error estimate, about h/12 * |second difference|."""
+    h = np.diff(x_vals)
+    if y_vals.size < 3:
+        return np.zeros_like(h)
+    curvature = np.abs(np.diff(y_vals, 2))
+    curvature = np.concatenate([curvature[:1], curvature, curvature[-1:]])
+    return h / 12 * np.maximum(curvature[:-1], curvature[1:])
+
+
+def sampled_integral(x_vals, y_vals):
+    """Cumulative trapezoid integral of samples that are already dense, with an error estimate."""
+    pieces = 0.5 * np.diff(x_vals) * (y_vals[:-1] + y_vals[1:])
+    integral_vals = np.concatenate([[0.0], np.cumsum(pieces)])
+    error_vals = np.concatenate([[0.0], np.cumsum(trapezoid_error(x_vals, y_vals))])
+    return integral_vals, error_vals
+
+
+def integral_from_antiderivative(f, x_vals, y_vals, F_vals):
+    """Turn antiderivative samples into the integral from x_vals[0], checking for branch jumps.
+
+    SymPy antiderivatives can jump (e.g. atan branches), so any interval where F
+    disagrees with the trapezoid rule by more than its error bound is integrated
+    again with Gauss-Kronrod.
+    """
+    if not np.all(np.isfinite(F_vals)) or not np.all(np.isfinite(y_vals)):
+        return cumulative_integral(f, x_vals)
+
+    h = np.diff(x_vals)
+    dF = np.diff(F_vals)
+    residual = np.abs(dF - 0.5 * h * (y_vals[:-1] + y_vals[1:]))
+    # Allow plenty of slack over the trapezoid error estimate
+    bound = 12 * trapezoid_error(x_vals, y_vals) + 1e-8 * (1.0 + np.abs(dF))
+
+    error = np.zeros_like(dF)
+    suspect = residual > bound
+    if suspect.any():
+        dF = dF.copy()
+        dF[suspect], error[suspect] = gauss_kronrod(f, x_vals[:-1][suspect], x_vals[1:][suspect])
+
+    integral_vals = np.concatenate([[0.0], np.cumsum(dF)])
+    rounding = np.finfo(float).eps * (np.abs(F_vals) + np.abs(F_vals[0]))
+    return integral_vals, np.concatenate([[0.0], np.cumsum(error)]) + rounding
+
+
+def sample_grid(compiled, x_min, x_max, order=1, initial=INITIAL_POINTS, max_points=MAX_POINTS):
+    """Adaptive x grid on which both f and its order-th derivative look smooth on screen.
+
+    compiled may also be a CompiledBatch, in which case every member is refined at once.
+    """
+    fused = compiled.fused(order)
+
+    def curves(x_vals):
+        checkpoint()
+        return fused(x_vals)[:2]
+
+    return adaptive_samples(curves, x_min, x_max, initial=initial, max_points=max_points)
+
+
+# Denominators are scanned for sign changes on this many points besides the symbolic search
+ROOT_SCAN_POINTS = 4097
+# Bisection steps when pinning down a sign change (plenty to reach float resolution)
+BISECT_STEPS = 60
+
+
+def singular_points(sympy_expr, x_min, x_max):
+    """Poles and domain edges of the expression inside [x_min, x_max], as sorted floats.
+
+    The search runs in the guard's worker; when it takes longer than
+    POLE_TIME_BUDGET this gives up with (), and find_breaks is left to spot
+    the poles on the samples.
+    """
+    try:
+        return limited(_singular_points, sympy_expr, float(x_min), float(x_max), timeout=POLE_TIME_BUDGET,
+                       poll=checkpoint)
+    except GuardError:
+        return ()
+
+
+def _singular_points(sympy_expr, x_min, x_max):
+    """The search behind singular_points.
+
+    sp.singularities can come back incomplete without failing, so its answer
+    is always combined with the sampled sign changes of every denominator.
+    """
+    domain = sp.Interval(x_min, x_max)
+    denominators = {sp.denom(sp.together(sympy_expr))}
+    denominators |= {node.base for node in sp.preorder_traversal(sympy_expr)
+                     if isinstance(node, sp.Pow) and node.exp.is_negative}
+    denominators = [d for d in denominators if d.has(x)]
+    try:
+        found = sp.singularities(sympy_expr, x, domain)
+    except Exception:
+        # Fall back to the usual suspects: zero denominators and log arguments
+        found = sp.S.EmptySet
+        candidates = denominators + [node.args[0] for node in sp.preorder_traversal(sympy_expr)
+                                     if isinstance(node, sp.log)]
+        for candidate in candidates:
+            try:
+                found = found | sp.solveset(candidate, x, domain)
+            except Exception:
+                continue
+
+    points = []
+    if isinstance(found, sp.FiniteSet):
+        for point in found:
+            try:
+                points.append(float(point))
+            except TypeError:
+                continue
+    for denominator in denominators:
+        points.extend(sign_changes(denominator, x_min, x_max))
+
+    points = np.sort([p for p in points if x_min <= p <= x_max])
+    # The same pole found symbolically and by bisection only counts once
+    keep = np.concatenate([[True], np.diff(points) > 1e-9 * max(x_max - x_min, 1.0)])[:points.size]
+    return tuple(float(p) for p in points[keep])
+
+
+class PoleCache:
+    """LRU cache of singular_points per compiled expression and parameter values.
+
+    Bound expressions rebuild their SymPy form for every parameter value, so
+    entries are keyed on compiled.key (the unbound expression plus the
+    values) instead. A window inside a range that was searched before is
+    answered from it, so zooming and panning don't search again.
+    """
+
+    def __init__(self, maxsize=256, ranges=4):
+        self.maxsize = maxsize
+        self.ranges = ranges
+        self._entries = OrderedDict()  # key -> [(x_min, x_max, points), ...]
+        self._lock = threading.Lock()
+
+    def get(self, compiled, x_min, x_max):
+        x_min, x_max = float(x_min), float(x_max)
+        with self._lock:
+            for low, high, points in self._entries.get(compiled.key, ()):
+                if low <= x_min and x_max <= high:
+                    self._entries.move_to_end(compiled.key)
+                    return tuple(p for p in points if x_min <= p <= x_max)
+
+        points = singular_points(compiled.expr, x_min, x_max)
+        with self._lock:
+            searched = self._entries.setdefault(compiled.key, [])
+            searched.append((x_min, x_max, points))
+            del searched[:-self.ranges]
+            self._entries.move_to_end(compiled.key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return points
+
+
+POLE_CACHE = PoleCache()
+
+
+def sign_changes(sympy_expr, x_min, x_max, samples=ROOT_SCAN_POINTS):
+    """Where the expression crosses zero on [x_min, x_max], found on a sample grid and bisected."""
+    if sympy_expr.free_symbols != {x} or not x_min < x_max:
+        return []
+    try:
+        f = lambdify_expression(sympy_expr)
+    except Exception:
+        return []
+    x_vals = np.linspace(x_min, x_max, samples)
+    y_vals = evaluate(f, x_vals)
+    zeros = list(x_vals[y_vals == 0])
+    crossing = np.flatnonzero(np.sign(y_vals[:-1]) * np.sign(y_vals[1:]) < 0)
+    return zeros + list(bisect_sign_change(f, x_vals[crossing], x_vals[crossing + 1]))
+
+
+def bisect_sign_change(f, a, b, steps=BISECT_STEPS):
+    """Shrink every bracket [a, b] around the sign change of f inside it; returns the midpoints."""
+    a, b = np.array(a, dtype=float), np.array(b, dtype=float)
+    f_a = np.sign(evaluate(f, a))
+    for _ in range(steps):
+        middle = 0.5 * (a + b)
+        f_middle = np.sign(evaluate(f, middle))
+        left = f_middle == -f_a
+        b = np.where(left, middle, b)
+        a = np.where(left, a, middle)
+        f_a = np.where(left, f_a, f_middle)
+    return 0.5 * (a + b)
+
+
+def break_scale(y_vals):
+    """Typical size of a curve from samples evenly spread over its range (see even_picks)."""
+    finite = y_vals[np.isfinite(y_vals)]
+    scale = np.percentile(np.abs(finite), 90) if finite.size else 1.0
+    return scale or 1.0
+
+
+def find_breaks(f, x_vals, y_vals, poles=(), scale=None):
+    """Find where the sampled curve must not be joined.
+
+    Returns (breaks, at_pole): interval i is broken when the curve is not
+    continuous between x_vals[i] and x_vals[i+1], and at_pole says whether it
+    blows up there (the integral restarts after a pole but carries on across
+    a finite jump). scale is the curve's break_scale, taken from these
+    samples unless given (so pieces of one grid can share it).
+    """
+    n_intervals = x_vals.size - 1
+    breaks = np.zeros(n_intervals, dtype=bool)
+    at_pole = np.zeros(n_intervals, dtype=bool)
+    if n_intervals < 1:
+        return breaks, at_pole
+
+    finite = np.isfinite(y_vals)
+    breaks |= ~(finite[:-1] & finite[1:])
+    if scale is None:
+        # Evenly spaced samples, since adaptive grids crowd around poles
+        scale = break_scale(y_vals[even_picks(x_vals)])
+
+    # Symbolic singularities, unless the curve is bounded and continuous across them
+    span = x_vals[-1] - x_vals[0]
+    for pole in poles:
+        i = min(max(np.searchsorted(x_vals, pole) - 1, 0), n_intervals - 1)
+        delta = span * 1e-7
+        left, right = evaluate(f, np.array([pole - delta, pole + delta]))
+        bounded = np.isfinite(left) and np.isfinite(right) and max(abs(left), abs(right)) <= 1e3 * scale
+        if bounded and abs(right - left) <= 1e-3 * scale:
+            # Removable, like sin(x)/x at 0
+            continue
+        breaks[i] = True
+        at_pole[i] = not bounded
+
+    # Jumps: a step much steeper than both neighbours, large enough to see on screen
+    if n_intervals >= 3:
+        with np.errstate(all="ignore"):
+            slope = np.abs(np.diff(y_vals) / np.diff(x_vals))
+            neighbours = np.maximum(np.concatenate([[0.0], slope[:-1]]), np.concatenate([slope[1:], [0.0]]))
+            step = np.abs(np.diff(y_vals))
+            jumps = (slope > JUMP_RATIO * neighbours) & (step > 0.05 * scale)
+        jumps &= np.isfinite(step)
+        breaks |= jumps
+        at_pole |= jumps & (np.maximum(np.abs(y_vals[:-1]), np.abs(y_vals[1:])) > 1e3 * scale)
+
+        # Poles nobody found symbolically (gamma's, say): a sign change with |y| growing towards it
+        # from both sides, kept when |f| keeps growing as we close in on the sign change
+        size = np.abs(y_vals)
+        with np.errstate(invalid="ignore"):
+            flips = np.sign(y_vals[:-1]) * np.sign(y_vals[1:]) < 0
+            towards = (np.concatenate([[False], size[1:-1] > size[:-2]])
+                       & np.concatenate([size[1:-1] > size[2:], [False]]))
+        candidates = np.flatnonzero(flips & towards & ~breaks)
+        if candidates.size:
+            centre = bisect_sign_change(f, x_vals[candidates], x_vals[candidates + 1])
+            width = x_vals[candidates + 1] - x_vals[candidates]
+            blows_up = np.ones(candidates.size, dtype=bool)
+            previous = None
+            for shrink in POLE_PROBES:
+                delta = width * shrink
+                near = np.minimum(np.abs(evaluate(f, centre - delta)), np.abs(evaluate(f, centre + delta)))
+                if previous is not None:
+                    with np.errstate(invalid="ignore"):
+                        blows_up &= near > POLE_GROWTH * previous
+                previous = near
+            breaks[candidates[blows_up]] = True
+            at_pole[candidates[blows_up]] = True
+
+    at_pole |= breaks & ~(finite[:-1] & finite[1:])
+    return breaks, at_pole
+
+
+def integral_offset(compiled, lower, start):
+    """Integral of f from lower to start and its error, for anchoring a window's integral at lower.
+
+    The integral restarts after every pole, so this is 0 when a pole lies
+    between lower and start (including poles outside the evaluated window).
+    """
+    if lower is None or not lower < start:
+        return 0.0, 0.0
+    if POLE_CACHE.get(compiled, lower, start):
+        return 0.0, 0.0
+    offset, offset_error = cumulative_integral(compiled.function, [lower, start])
+    return offset[-1], offset_error[-1]
+
+
+def evaluate_chebyshev(compiled, x_vals, order=1, lower=None):
+    """Derivative and integral from a Chebyshev fit of f over the sampled range.
+
+    Returns (y_vals, dydx_vals, integral_vals, integral_error), or None when f
+    is not smooth enough on the range for the series to converge.
+    """
+    series = compiled.chebyshev(x_vals[0], x_vals[-1])
+    if series is None:
+        return None
+
+    y_vals = evaluate(compiled.function, x_vals)
+    dydx_vals = series.derivative(order)(x_vals)
+    antiderivative = series.integral()
+    integral_vals = antiderivative(x_vals)
+    integral_error = np.full_like(x_vals, antiderivative.error)
+
+    offset, offset_error = integral_offset(compiled, lower, x_vals[0])
+    return y_vals, dydx_vals, integral_vals + offset, integral_error + offset_error
+
+
+def segment_curves(compiled, x_vals, y_vals, dydx_vals, F_vals, order=1, lower=None, numeric="balanced",
+                   engine="symbolic", areas=None, start=None, guide=None):
+    """Finish one curve whose kernel outputs are already evaluated, without crossing a pole or jump.
+
+    dydx_vals and F_vals are None where there is no closed form. areas can
+    hold precomputed interval_integrals (area, error) of f on the grid, which
+    then replace quadrature. start is the (integral, error) at x_vals[0]
+    carried over from an earlier piece of the same grid, and replaces lower.
+    guide is (poles, scale) found once for the whole grid (see break_guides),
+    so its pieces neither search again nor judge breaks by their own scale.
+    Returns (y_vals, dydx_vals, integral_vals, integral_error, breaks) on the
+    given grid.
+    """
+    f = compiled.function
+    if guide is None:
+        poles, scale = POLE_CACHE.get(compiled, x_vals[0], x_vals[-1]), None
+    else:
+        poles, scale = guide
+        poles = [p for p in poles if x_vals[0] <= p <= x_vals[-1]]
+    breaks, at_pole = find_breaks(f, x_vals, y_vals, poles, scale)
+
+    if engine == "chebyshev" and not breaks.any():
+        spectral = evaluate_chebyshev(compiled, x_vals, order, None if start is not None else lower)
+        if spectral is not None:
+            if start is not None:
+                spectral = (*spectral[:2], spectral[2] + start[0], spectral[3] + start[1])
+            return (*spectral, breaks)
+
+    if dydx_vals is None:
+        # Pointwise, so it does not smear across breaks the way np.gradient would
+        dydx_vals = fallback_derivative(f, x_vals, order, numeric)
+    integral_vals = np.full_like(y_vals, np.nan)
+    integral_error = np.full_like(y_vals, np.nan)
+
+    # Carry on from the previous piece, or anchor at lower unless a pole lies in between
+    running, running_error = start if start is not None else integral_offset(compiled, lower, x_vals[0])
+
+    edges = np.concatenate([[0], np.flatnonzero(breaks) + 1, [x_vals.size]])
+    for start, stop in zip(edges[:-1], edges[1:]):
+        checkpoint()
+        xs, ys = x_vals[start:stop], y_vals[start:stop]
+        if not np.all(np.isfinite(ys)):
+            continue
+        if start > 0:
+            if at_pole[start - 1]:
+                running, running_error = 0.0, 0.0
+            elif areas is not None:
+                running, running_error = running + areas[0][start - 1], running_error + areas[1][start - 1]
+            else:
+                # Finite jump: carry the area of the interval that contains it
+                gap, gap_error = gauss_kronrod(f, x_vals[start - 1:start], x_vals[start:start + 1])
+                running, running_error = running + gap[0], running_error + gap_error[0]
+
+        if F_vals is not None:
+            seg_integral, seg_error = integral_from_antiderivative(f, xs, ys, F_vals[start:stop])
+        elif areas is not None:
+            seg_integral = np.concatenate([[0.0], np.cumsum(areas[0][start:stop - 1])])
+            seg_error = np.concatenate([[0.0], np.cumsum(areas[1][start:stop - 1])])
+        elif xs.size > DENSE_SAMPLES:
+            seg_integral, seg_error = sampled_integral(xs, ys)
+        else:
+            seg_integral, seg_error = cumulative_integral(f, xs)
+
+        integral_vals[start:stop] = running + seg_integral
+        integral_error[start:stop] = running_error + seg_error
+        running, running_error = integral_vals[stop - 1], integral_error[stop - 1]
+
+    return y_vals, dydx_vals, integral_vals, integral_error, breaks
+
+
+def insert_breaks(x_vals, y_vals, breaks, curves):
+    """Insert a gap sample into every broken interval of (curves, points) arrays sharing x_vals.
+
+    Curves broken there get a NaN, so plots show a gap instead of a vertical
+    spike; the others get the midpoint of their straight segment, which draws
+    exactly as before. Non-finite samples already leave a gap and need no cut.
+    """
+    cut_rows = breaks & np.isfinite(y_vals[:, :-1]) & np.isfinite(y_vals[:, 1:])
+    cut = np.flatnonzero(np.any(cut_rows, axis=0))
+    gap_x = 0.5 * (x_vals[cut] + x_vals[cut + 1])
+    gapped = []
+    for values in curves:
+        gap_values = np.where(cut_rows[:, cut], np.nan, 0.5 * (values[:, cut] + values[:, cut + 1]))
+        gapped.append(np.insert(values, cut + 1, gap_values, axis=1))
+    return np.insert(x_vals, cut + 1, gap_x), gapped
+
+
+def evaluate_segments(compiled, x_vals, order=1, lower=None, numeric="balanced", engine="symbolic"):
+    """Evaluate f, its order-th derivative and its integral from x_vals[0] (or lower) without crossing a pole.
+
+    Closed forms come out of one fused kernel; derivatives SymPy cannot do
+    come from Taylor-mode AD, and numeric picks the accuracy/cost preset for
+    those AD cannot do either. The domain is split into continuous segments
+    using the symbolic singularities and jump detection on the samples.
+    Returns (x_vals, y_vals, dydx_vals, integral_vals, integral_error) where a
+    NaN sample is inserted at every break, so plots show a gap instead of a
+    vertical spike.
+
+    engine "chebyshev" takes derivative and integral from a Chebyshev series
+    when f is smooth over the whole range, and the symbolic path otherwise.
+    engine "autodiff" skips sp.diff and differentiates f by Taylor-mode AD.
+    """
+    x_vals = np.asarray(x_vals, dtype=float)
+    if engine == "autodiff":
+        # Order 0 compiles f and F only, so SymPy never builds the derivative
+        y_vals, _, F_vals = compiled.fused(0)(x_vals)
+        dydx_vals = None
+    else:
+        y_vals, dydx_vals, F_vals = compiled.fused(order)(x_vals)
+
+    *curves, breaks = segment_curves(compiled, x_vals, y_vals, dydx_vals, F_vals, order, lower, numeric, engine)
+    x_vals, curves = insert_breaks(x_vals, curves[0][None], breaks[None], [c[None] for c in curves])
+    return (x_vals, *(c[0] for c in curves))
+
+
+def break_guides(batch, x_min, x_max, columns=1000):
+    """Per-member (poles, scale) over [x_min, x_max], for batch_rows on pieces of a grid spanning it."""
+    x_vals = np.linspace(x_min, x_max, columns)
+    Y = evaluate(batch.function, x_vals).reshape(len(batch), columns)
+    return [(POLE_CACHE.get(member, x_min, x_max), break_scale(y_vals))
+            for member, y_vals in zip(batch.members, Y)]
+
+
+def batch_rows(batch, x_vals, order=1, lower=None, numeric="balanced", engine="symbolic", starts=None,
+               guides=None):
+    """Per-member (y_vals, dydx_vals, integral_vals, integral_error, breaks) on the grid, without gap samples.
+
+    All closed forms come out of a single batched kernel call, and members
+    without an antiderivative share one batched quadrature pass; only numeric
+    derivatives and break handling are done per curve. starts can hold each
+    member's (integral, error) at x_vals[0], and guides each member's
+    break_guides entry (see segment_curves).
+    """
+    x_vals = np.asarray(x_vals, dtype=float)
+    d_exprs, F_exprs = batch.closed_forms(0 if engine == "autodiff" else order)
+    Y, D, F = batch.fused(0 if engine == "autodiff" else order)(x_vals)
+    if engine == "autodiff":
+        d_exprs = [None] * len(batch)
+
+    areas = [None] * len(batch)
+    quadrature = [i for i, F_expr in enumerate(F_exprs) if F_expr is None]
+    if quadrature and 1 < x_vals.size <= DENSE_SAMPLES:
+        area, error = interval_integrals(batch.subset(quadrature).function, x_vals)
+        for row, i in enumerate(quadrature):
+            areas[i] = (area[row], error[row])
+
+    rows = []
+    for i, member in enumerate(batch.members):
+        checkpoint(fraction=i / len(batch))
+        rows.append(segment_curves(member, x_vals, Y[i], None if d_exprs[i] is None else D[i],
+                                   None if F_exprs[i] is None else F[i], order, lower, numeric, engine, areas[i],
+                                   None if starts is None else starts[i], None if guides is None else guides[i]))
+    return rows
+
+
+def stack_rows(x_vals, rows):
+    """Join batch_rows output into x_vals and (members, points) arrays of y, derivative, integral and error."""
+    *curves, breaks = (np.vstack(parts) for parts in zip(*rows))
+    x_vals, curves = insert_breaks(np.asarray(x_vals, dtype=float), curves[0], breaks, curves)
+    return (x_vals, *curves)
+
+
+def evaluate_batch(batch, x_vals, order=1, lower=None, numeric="balanced", engine="symbolic"):
+    """evaluate_segments for every member of a CompiledBatch on one shared grid.
+
+    Returns x_vals and (members, points) arrays of y, derivative, integral and
+    integral error, with a gap sample at every member's breaks.
+    """
+    return stack_rows(x_vals, batch_rows(batch, x_vals, order, lower, numeric, engine))
+
+
+def sweep_curves(batch, x_vals, values, name, grid, order=1, lower=None, numeric="balanced"):
+    """Evaluate every member of a parametric batch over a whole grid of one parameter at once.
+
+    values holds the other parameters and the swept one takes each value of
+    grid; the kernels broadcast the grid against x_vals in a single call.
+    Returns (y, dydx, integral, integral_error) arrays shaped (members,
+    len(grid), points), with integrals measured from x_vals[0] (or lower).
+    Poles and jumps are not split out here.
+    """
+    x_vals = np.asarray(x_vals, dtype=float)
+    grid = np.asarray(grid, dtype=float)
+    shape = (len(batch), grid.size, x_vals.size)
+
+    def arguments(parameters):
+        # The swept parameter runs down a new leading axis
+        return [grid[:, None] if symbol.name == name else float(values[symbol.name]) for symbol in parameters]
+
+    d_exprs, F_exprs = batch.closed_forms(order)
+    Y, D, F = (np.broadcast_to(part, shape).copy()
+               for part in batch.fused(order)(x_vals, *arguments(batch.parameters)))
+
+    for i, d_expr in enumerate(d_exprs):
+        if d_expr is None:
+            # No closed form: one fallback derivative per parameter value
+            for k, value in enumerate(grid):
+                member = batch.members[i].bind({**values, name: value})
+                D[i, k] = fallback_derivative(member.function, x_vals, order, numeric)
+
+    start = x_vals[0] if lower is None else lower
+    grid_x = x_vals if start == x_vals[0] else np.concatenate([[start], x_vals])
+    integral = np.empty(shape)
+    error = np.empty(shape)
+    for i, F_expr in enumerate(F_exprs):
+        single = batch.subset([i])
+        args = arguments(single.parameters)
+        if F_expr is not None:
+            F_start = np.broadcast_to(single.fused(order)(np.array([start]), *args)[2][0], (grid.size, 1))
+            if np.all(np.isfinite(F[i])) and np.all(np.isfinite(F_start)):
+                integral[i] = F[i] - F_start
+                error[i] = np.finfo(float).eps * (np.abs(F[i]) + np.abs(F_start))
+                continue
+
+        # One stacked quadrature pass for the whole family (also when F leaves its real domain)
+        family = lambda xs: np.broadcast_to(single.function(xs, *args)[0], (grid.size, np.size(xs)))
+        area, area_error = interval_integrals(family, grid_x)
+        zeros = np.zeros((grid.size, 1))
+        integral[i] = np.cumsum(np.concatenate([zeros, area], axis=1), axis=1)[:, -x_vals.size:]
+        error[i] = np.cumsum(np.concatenate([zeros, area_error], axis=1), axis=1)[:, -x_vals.size:]
+    return Y, D, integral, error
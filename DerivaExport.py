@@ -0,0 +1,164 @@
+import csv
+import json
+import os
+import zipfile
+
+import numpy as np
+
+from DerivaEngine import batch_rows, break_guides, checkpoint
+
+# Writing computed curves to data files a chunk of rows at a time (bounded
+# memory, progress and cancellation through DerivaEngine.checkpoint)
+
+CHUNK_ROWS = 65536
+# Significant digits; 17 reads back as exactly the same float64
+PRECISIONS = (6, 10, 15, 17)
+DELIMITERS = {"Comma": ",", "Semicolon": ";", "Tab": "\t"}
+
+# Binary data files by extension; all hold float64 columns (x, then f, f^(n) and F per function)
+DATA_FORMATS = {".npy": "npy", ".npz": "npz", ".raw": "raw"}
+DTYPE = np.dtype("<f8")
+# Points evaluated per step when streaming from the engine
+EVALUATE_ROWS = 2**18
+# Raw files start with a JSON header padded to this many bytes (more only if it doesn't fit)
+RAW_HEADER_BYTES = 4096
+
+
+def write_csv(path, columns, header=None, precision=17, delimiter=",", chunk_rows=CHUNK_ROWS):
+    """Write equal-length 1-D columns as CSV, optionally under a header row.
+
+    Each chunk of rows is formatted by one %-format of the whole block, not a
+    Python call per row or value. A cancelled or failed export removes the
+    partial file.
+    """
+    columns = [np.asarray(column) for column in columns]
+    rows = len(columns[0])
+    row_format = delimiter.join([f"%.{int(precision)}g"] * len(columns)) + "\n"
+    try:
+        with open(path, "w", newline="") as csvfile:
+            if header is not None:
+                # csv quotes names that contain the delimiter (e.g. "sin(x), cos(x)")
+                csv.writer(csvfile, delimiter=delimiter).writerow(header)
+            for start in range(0, rows, chunk_rows):
+                checkpoint(fraction=start / rows)
+                block = np.column_stack([column[start:start + chunk_rows] for column in columns])
+                csvfile.write((row_format * len(block)) % tuple(block.ravel().tolist()))
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def column_names(expressions, order):
+    """x, then f, the order-th derivative and F for each function (numbered when there are several)."""
+    names = ["x"]
+    for i in range(len(expressions)):
+        suffix = f"_{i + 1}" if len(expressions) > 1 else ""
+        names += [f"f{suffix}", f"d{order}f{suffix}", f"F{suffix}"]
+    return names
+
+
+def array_chunks(columns, chunk_rows=EVALUATE_ROWS):
+    """(start, block) pieces of arrays that are already computed, block being (columns, rows)."""
+    rows = len(columns[0])
+    for start in range(0, rows, chunk_rows):
+        yield start, np.vstack([column[start:start + chunk_rows] for column in columns])
+
+
+def engine_chunks(bound, x_range, order, samples, numeric="balanced", engine="symbolic", chunk_rows=EVALUATE_ROWS):
+    """(start, block) pieces of f, f^(n) and F on samples evenly spaced points, evaluated a piece at a time.
+
+    bound is a bound CompiledBatch. Each piece is evaluated together with the
+    last point of the one before and carries its integrals on from there, so
+    the pieces join up (restarting after poles, including one that falls
+    between two pieces) as if the whole grid had been evaluated at once, but
+    only one piece is ever in memory. Poles are searched for once over the
+    whole range, and every piece judges breaks by the same scale.
+    """
+    step = (x_range[1] - x_range[0]) / (samples - 1)
+    guides = break_guides(bound, *x_range)
+    previous = None
+    for start in range(0, samples, chunk_rows):
+        index = np.arange(max(start - 1, 0), min(start + chunk_rows, samples))
+        x_vals = x_range[0] + step * index
+        x_vals[index == samples - 1] = x_range[1]
+        rows = batch_rows(bound, x_vals, order, numeric=numeric, engine=engine, starts=previous, guides=guides)
+        previous = [(integral_vals[-1], integral_error[-1]) for _, _, integral_vals, integral_error, _ in rows]
+        block = np.vstack([x_vals] + [curve for y_vals, dydx_vals, F_vals, _, _ in rows
+                                      for curve in (y_vals, dydx_vals, F_vals)])
+        yield start, block[:, 1:] if start else block
+
+
+def raw_header(names, rows, metadata=None):
+    """JSON header of a raw file, padded with spaces so the data starts at a fixed offset."""
+    header = {"format": "deriva-columns", "version": 1, "dtype": DTYPE.str, "layout": "columns",
+              "shape": [len(names), rows], "columns": names, **(metadata or {})}
+    offset = RAW_HEADER_BYTES
+    while True:
+        header["offset"] = offset
+        text = json.dumps(header).encode()
+        if len(text) < offset:
+            return text.ljust(offset - 1) + b"\n"
+        offset += RAW_HEADER_BYTES
+
+
+def write_data(path, names, rows, chunks, metadata=None):
+    """Write float64 columns to a .npy, .npz or .raw file (by extension) as the chunks come in.
+
+    chunks yields (start, block) with block (len(names), n) for rows start to
+    start + n (see array_chunks and engine_chunks). Every format keeps each
+    column contiguous, so a column can be read without touching the others:
+
+    .npy: one (columns, rows) array; np.load(path, mmap_mode="r")[k] is column k.
+    .npz: one array per column under its name, plus "metadata" (a JSON string).
+    .raw: a JSON header (RAW_HEADER_BYTES long unless its "offset" says
+          otherwise), then the columns, little-endian, one after another:
+          np.memmap(path, "<f8", "r", offset=4096, shape=(columns, rows)).
+
+    The file is filled through a memory map, so it may be larger than RAM.
+    A cancelled or failed export removes the partial file.
+    """
+    kind = DATA_FORMATS[os.path.splitext(path)[1].lower()]
+    shape = (len(names), rows)
+    target = path + ".part.npy" if kind == "npz" else path
+    try:
+        if kind == "raw":
+            header = raw_header(names, rows, metadata)
+            with open(path, "wb") as raw_file:
+                raw_file.write(header)
+                raw_file.truncate(len(header) + DTYPE.itemsize * len(names) * rows)
+            data = np.memmap(path, DTYPE, "r+", offset=len(header), shape=shape)
+        else:
+            data = np.lib.format.open_memmap(target, "w+", DTYPE, shape)
+
+        for start, block in chunks:
+            checkpoint(f"{start + block.shape[1]:,} of {rows:,} rows")
+            data[:, start:start + block.shape[1]] = block
+        data.flush()
+        del data
+
+        if kind == "npz":
+            packed = np.load(target, mmap_mode="r")
+            write_npz_columns(path, names, packed, metadata)
+            del packed  # unmapped before the file is removed (Windows won't delete a mapped file)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    finally:
+        if target != path and os.path.exists(target):
+            os.remove(target)
+
+
+def write_npz_columns(path, names, data, metadata=None):
+    """Copy each column of a (columns, rows) array into its own .npz member, a chunk at a time."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name, column in zip(names, data):
+            with archive.open(f"{name}.npy", "w", force_zip64=True) as member:
+                np.lib.format.write_array_header_2_0(
+                    member, {"descr": DTYPE.str, "fortran_order": False, "shape": column.shape})
+                for start in range(0, len(column), EVALUATE_ROWS):
+                    checkpoint(f"Packing {name}")
+                    member.write(np.ascontiguousarray(column[start:start + EVALUATE_ROWS]).tobytes())
+        with archive.open("metadata.npy", "w") as member:
+            np.lib.format.write_array(member, np.array(json.dumps({"columns": names, **(metadata or {})})))
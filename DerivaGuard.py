@@ -0,0 +1,262 @@
+import ast
+import math
+import multiprocessing
+import threading
+import time
+
+import numpy as np
+
+# Resource guard for user expressions: a static pre-check, then parsing and a
+# test evaluation in a worker process with time and memory limits. The engine
+# runs its slow SymPy steps (integrate, singularities) through the same worker.
+
+MAX_LENGTH = 5000
+MAX_NODES = 2000
+MAX_DEPTH = 60
+# Largest constant exponent, and largest exact number (in decimal digits) the constants may build
+MAX_EXPONENT = 10000
+MAX_DIGITS = 100000
+# Largest constant argument to factorial and friends
+MAX_FACTORIAL = 1000
+GUARD_TIMEOUT = 5.0
+GUARD_MEMORY = 512 * 2**20
+GUARD_WORKERS = 1
+# Starting a worker (spawn plus the SymPy import) is not held against the expression
+STARTUP_TIMEOUT = 120.0
+# How often a waiting caller gets to check for cancellation
+POLL_INTERVAL = 0.1
+
+# SymPy evaluates these eagerly on integer arguments
+COMBINATORIAL = {"factorial", "factorial2", "subfactorial", "binomial", "fibonacci", "lucas",
+                 "bell", "bernoulli", "catalan", "harmonic", "prime", "primorial"}
+CONSTANTS = {"pi", "e", "E"}
+
+TEST_POINTS = np.concatenate([np.linspace(-1.0, 1.0, 5), [0.5]])
+
+
+class GuardError(ValueError):
+    """The expression is too big or too slow to evaluate safely."""
+
+
+def _magnitude(node):
+    """Upper bound on log10 of a constant subtree's size, or None when it depends on a symbol.
+
+    Raises GuardError for exponents and factorials that would build huge exact numbers.
+    """
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, (int, float, complex)) and not isinstance(node.value, bool):
+            return math.log10(max(abs(node.value), 1.0))
+        return None
+    if isinstance(node, ast.Name):
+        return 1.0 if node.id in CONSTANTS else None
+    if isinstance(node, ast.UnaryOp):
+        return _magnitude(node.operand)
+
+    if isinstance(node, ast.BinOp):
+        left, right = _magnitude(node.left), _magnitude(node.right)
+        if isinstance(node.op, ast.Pow):
+            if right is not None and right > math.log10(MAX_EXPONENT):
+                raise GuardError(f"Exponent is too large (at most {MAX_EXPONENT:,} is allowed)")
+            if left is None or right is None:
+                return None
+            digits = left * 10**right
+            if digits > MAX_DIGITS:
+                raise GuardError(f"Number is too large (about 10^{digits:,.0f})")
+            return digits
+        if left is None or right is None:
+            return None
+        if isinstance(node.op, (ast.Add, ast.Sub)):
+            return max(left, right) + math.log10(2)
+        return left + right
+
+    if isinstance(node, ast.Call):
+        arguments = [_magnitude(argument) for argument in node.args]
+        for keyword in node.keywords:
+            _magnitude(keyword.value)
+        name = node.func.id if isinstance(node.func, ast.Name) else None
+        if name in COMBINATORIAL:
+            for magnitude in arguments:
+                if magnitude is not None and 10**magnitude > MAX_FACTORIAL:
+                    raise GuardError(f"Argument of {name} is too large (at most {MAX_FACTORIAL:,} is allowed)")
+        return None
+
+    for child in ast.iter_child_nodes(node):
+        _magnitude(child)
+    return None
+
+
+def precheck(text):
+    """Reject expressions that are obviously too big before SymPy sees them.
+
+    Looks at the length, the number of operations, the nesting depth and the
+    size of constant exponents and factorials. Text Python cannot parse
+    (e.g. SymPy's 5! notation) is left to the worker's time limit.
+    """
+    text = str(text)
+    if len(text) > MAX_LENGTH:
+        raise GuardError(f"Expression is too long ({len(text):,} characters, at most {MAX_LENGTH:,})")
+    try:
+        # SymPy reads ^ as ** (right-associative), so check it that way
+        tree = ast.parse(text.strip().replace("^", "**"), mode="eval")
+    except (SyntaxError, ValueError):
+        return
+    except (RecursionError, MemoryError):
+        raise GuardError("Expression is nested too deeply")
+
+    count, stack = 0, [(tree, 0)]
+    while stack:
+        node, depth = stack.pop()
+        count += 1
+        if depth > MAX_DEPTH:
+            raise GuardError(f"Expression is nested too deeply (at most {MAX_DEPTH} levels)")
+        stack.extend((child, depth + 1) for child in ast.iter_child_nodes(node))
+    if count > MAX_NODES:
+        raise GuardError(f"Expression is too long ({count:,} operations, at most {MAX_NODES:,})")
+    _magnitude(tree.body)
+
+
+def _limit_memory(memory):
+    """Cap the worker's address space at what it uses now plus memory bytes (Linux only)."""
+    try:
+        import resource
+        with open("/proc/self/statm") as statm:
+            in_use = int(statm.read().split()[0]) * resource.getpagesize()
+    except (ImportError, OSError, ValueError):
+        return
+    limit = in_use + memory
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _worker_init(memory):
+    # Pay for the SymPy/SciPy imports once per worker, then fence it in
+    import DerivaEngine  # noqa: F401
+    _limit_memory(memory)
+
+
+def _check_expression(text):
+    """Parse and test-evaluate an expression (runs in the worker)."""
+    import sympy as sp
+    from DerivaEngine import evaluate, expression_parameters, lambdify_expression, parse_expression
+
+    try:
+        sympy_expr = parse_expression(text)
+    except MemoryError:
+        raise
+    except Exception:
+        # Syntax errors are reported by the caller's own parse
+        return
+    if not isinstance(sympy_expr, sp.Expr):
+        # e.g. isprime(7) or x > 1, which parse to a boolean
+        raise GuardError("Expression must give a number, not a true/false condition")
+    try:
+        parameters = expression_parameters(sympy_expr)
+        function = lambdify_expression(sympy_expr, parameters)
+        evaluate(lambda x_vals: function(x_vals, *[1.0] * len(parameters)), TEST_POINTS)
+    except MemoryError:
+        raise
+    except Exception:
+        pass
+
+
+def _ready():
+    return True
+
+
+_pool = None
+_started = None  # completes once the worker has finished its imports
+_in_use = False  # whether this process runs its SymPy work through the guard at all
+_pool_lock = threading.Lock()
+
+
+def start_guard():
+    """Start the worker pool (and its imports) ahead of the first expression."""
+    global _pool, _started, _in_use
+    with _pool_lock:
+        _in_use = True
+        if _pool is None:
+            # spawn, as forking a process with a Tk main loop and worker threads is unsafe
+            context = multiprocessing.get_context("spawn")
+            _pool = context.Pool(GUARD_WORKERS, initializer=_worker_init, initargs=(GUARD_MEMORY,))
+            _started = _pool.apply_async(_ready)
+        return _pool, _started
+
+
+def stop_guard():
+    """Kill the worker pool; the next guarded call starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.terminate()
+
+
+def _discard(pool):
+    """Kill a pool whose worker is stuck, unless it was already replaced."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.terminate()
+
+
+def _wait(pending, timeout, poll):
+    """pending.get(timeout), calling poll every POLL_INTERVAL seconds while waiting."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return pending.get(max(min(POLL_INTERVAL, deadline - time.monotonic()), 0))
+        except multiprocessing.TimeoutError:
+            if time.monotonic() >= deadline:
+                raise
+            if poll is not None:
+                poll()
+
+
+def guarded(function, *args, timeout=GUARD_TIMEOUT, poll=None):
+    """Run a picklable function in the guard's worker process and return its result.
+
+    A worker that runs past timeout seconds (or dies) is killed and replaced;
+    starting the worker does not count towards the timeout. poll, if given,
+    is called while waiting and may raise to stop waiting (e.g.
+    DerivaEngine.checkpoint); the worker then finishes on its own.
+    """
+    try:
+        pool, started = start_guard()
+    except OSError:
+        # No processes available (sandboxes, some frozen builds): run unguarded
+        return function(*args)
+
+    try:
+        _wait(started, STARTUP_TIMEOUT, poll)
+    except multiprocessing.TimeoutError:
+        _discard(pool)
+        raise GuardError("The expression checker did not start")
+
+    try:
+        return _wait(pool.apply_async(function, args), timeout, poll)
+    except multiprocessing.TimeoutError:
+        _discard(pool)
+        raise GuardError(f"Expression took longer than {timeout:g} s to evaluate "
+                         f"or needed more than {GUARD_MEMORY // 2**20} MB")
+    except MemoryError:
+        raise GuardError(f"Expression needs more than {GUARD_MEMORY // 2**20} MB to evaluate")
+
+
+def limited(function, *args, timeout=GUARD_TIMEOUT, poll=None):
+    """guarded(), in a process that uses the guard; anywhere else function just runs.
+
+    That keeps the guard's own worker, and batch workers whose parent already
+    checked the expressions, from each starting a guard process of their own.
+    """
+    if not _in_use:
+        return function(*args)
+    return guarded(function, *args, timeout=timeout, poll=poll)
+
+
+def guard_expression(text, timeout=GUARD_TIMEOUT, poll=None):
+    """Raise GuardError unless text can be parsed and evaluated within the limits."""
+    precheck(text)
+    guarded(_check_expression, str(text), timeout=timeout, poll=poll)
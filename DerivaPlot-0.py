@@ -1,15 +1,26 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-import sympy as sp
-from scipy.integrate import quad
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 import os
-from PIL import Image, ImageDraw, ImageFont
+import multiprocessing
+from DerivaEngine import compile_expression, evaluate_segments, sample_grid
+from DerivaRender import RECEIPT_GRAPH_BOX, figure_image, receipt_image
 
 # On this update: First
 
+# This version's receipts are taller, with the group members below the thanks
+RECEIPT_FOOTER = """Thank you for using DerivaPlot
+
+            Group Members:
+            Anino, Glenn
+            Antonio, Den
+            Casia, Jaybird
+            Espina, Cyril
+            Flores, Sophia
+            Lacanaria, Lorenz"""
+
 class FunctionVisualizerApp:
     def __init__(self, root):
         self.root = root
@@ -195,13 +206,9 @@ class FunctionVisualizerApp:
             return False, None, None, None
             
         try:
-            x = sp.symbols('x')
-            # Convert the expression into a sympy function
-            sympy_expr = sp.sympify(expr, locals={"sin": sp.sin, "cos": sp.cos, "tan": sp.tan, 
-                                                "exp": sp.exp, "log": sp.log, "sqrt": sp.sqrt,
-                                                "pi": sp.pi, "e": sp.E})
-            # Convert to a lambda function that NumPy can evaluate
-            f = sp.lambdify(x, sympy_expr, 'numpy')
+            # Parse and compile once; expressions seen before come from the compile cache
+            compiled = compile_expression(expr)
+            f = compiled.function
             
             # Ensure numerical validity
             x_min_val = float(x_min)
@@ -221,27 +228,22 @@ class FunctionVisualizerApp:
             except Exception:
                 raise ValueError("Function cannot be evaluated. Check your syntax.")
             
+            # Kept for the symbolic derivative and exports
+            self.compiled = compiled
             return True, f, (x_min_val, x_max_val), order_val
         except Exception as e:
             messagebox.showerror("Input Error", f"Invalid input: {e}")
             return False, None, None, None
             
-    def numerical_derivative(self, f, x_vals, order=1):
-        """Compute the numerical derivative of a function."""
-        if order == 1:
-            dx = x_vals[1] - x_vals[0]
-            return np.gradient(f(x_vals), dx)
-        else:
-            # Simple implementation for higher order derivatives
-            result = f(x_vals)
-            for _ in range(order):
-                dx = x_vals[1] - x_vals[0]
-                result = np.gradient(result, dx)
-            return result
+    def compute_curves(self, compiled, x_vals, order=1):
+        """Compute the function, its derivative and its integral in one fused pass.
 
-    def numerical_integral(self, f, x_vals):
-        """Compute the numerical integral of a function."""
-        return np.array([quad(f, x_vals[0], x)[0] for x in x_vals])
+        Returns x_vals with a gap sample added at every pole or jump, so the
+        curves are not joined (or integrated) across it.
+        """
+        # Symbolic derivative/antiderivative when they exist, numeric fallbacks otherwise
+        x_vals, y_vals, dydx_vals, integral_vals, self.integral_error = evaluate_segments(compiled, x_vals, order)
+        return x_vals, y_vals, dydx_vals, integral_vals
         
     def on_plot(self):
         """Handle the plot button click."""
@@ -261,12 +263,11 @@ class FunctionVisualizerApp:
             self.root.update()
             
             # Create plot
-            x_vals = np.linspace(x_range[0], x_range[1], 400)
+            # Coarse grid refined wherever the curves bend
+            x_vals = sample_grid(self.compiled, x_range[0], x_range[1], order_val)
             
             try:
-                y_vals = f(x_vals)
-                dydx_vals = self.numerical_derivative(f, x_vals, order_val)
-                integral_vals = self.numerical_integral(f, x_vals)
+                x_vals, y_vals, dydx_vals, integral_vals = self.compute_curves(self.compiled, x_vals, order_val)
                 
                 # Create figure
                 plt.style.use('default')  # Reset style
@@ -322,10 +323,11 @@ class FunctionVisualizerApp:
                 self.current_data = {
                     "expr": self.entry_func.get(),
                     "x_range": x_range,
-                    "order": order_val
+                    "order": order_val,
+                    "x_vals": x_vals
                 }
                 
-                self.status_var.set("Plot completed successfully")
+                self.status_var.set(f"Plot completed successfully (integral error ≤ {np.nanmax(self.integral_error):.1e})")
             except Exception as e:
                 messagebox.showerror("Calculation Error", f"Error calculating results: {e}")
                 self.status_var.set("Error in calculation")
@@ -367,56 +369,12 @@ class FunctionVisualizerApp:
         if not receipt_path:
             return
         
-        temp_path = None
-
         try:
-            # Create receipt image
-            receipt_width, receipt_height = 600, 800
-            image = Image.new('RGB', (receipt_width, receipt_height), 'white')
-            draw = ImageDraw.Draw(image)
-            
-            # Try to load a better font, fall back to default if not available
-            try:
-                font_title = ImageFont.truetype("arial", 24)
-                font_text = ImageFont.truetype("arial", 16)
-            except:
-                font_title = ImageFont.load_default()
-                font_text = ImageFont.load_default()
-            
-            # Add header
-            draw.text((30, 30), "Function Visualizer Receipt", fill="black", font=font_title)
-            draw.text((30, 80), f"Function: {self.current_data['expr']}", fill="black", font=font_text)
-            draw.text((30, 110), f"X Range: [{self.current_data['x_range'][0]}, {self.current_data['x_range'][1]}]", 
-                    fill="black", font=font_text)
-            draw.text((30, 140), f"Derivative Order: {self.current_data['order']}", fill="black", font=font_text)
-            draw.text((30, 170), f"Date: {np.datetime64('today')}", fill="black", font=font_text)
-            
-            # temp file
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                temp_path = temp_file.name
-                self.fig.savefig(temp_path, dpi=150, bbox_inches='tight')
-            
-            # graph to receipt
-            graph_img = Image.open(temp_path)
-            graph_img = graph_img.resize((520, 380), Image.LANCZOS)
-            image.paste(graph_img, (40, 200))
-            
-
-
-            # Footer
-            footer_text = """Thank you for using DerivaPlot
-
-            Group Members:
-            Anino, Glenn
-            Antonio, Den
-            Casia, Jaybird
-            Espina, Cyril
-            Flores, Sophia
-            Lacanaria, Lorenz"""
-
-            draw.text((30, 600), footer_text, fill="black", font=font_text)
-
+            # The graph is drawn straight at its size on the receipt; nothing goes through a file
+            graph = figure_image(self.fig, size=RECEIPT_GRAPH_BOX[2:])
+            image = receipt_image(graph, self.current_data['expr'], self.current_data['x_range'],
+                                  self.current_data['order'],
+                                  size=(600, 800), footer=RECEIPT_FOOTER)
             
             # Save receipt
             image.save(receipt_path)
@@ -426,10 +384,6 @@ class FunctionVisualizerApp:
             
         except Exception as e:
             messagebox.showerror("Save Error", f"Error saving receipt: {e}")
-        finally:
-            # temp file cleannerr
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)   
     
     def on_closing(self):
         """Handle window closing."""
@@ -443,4 +397,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Lets frozen builds start the expression guard's worker process
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
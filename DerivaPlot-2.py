@@ -1,16 +1,41 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-import sympy as sp
-from scipy.integrate import quad
+from matplotlib.lines import Line2D
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 import os
-from PIL import Image, ImageDraw, ImageFont
-import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from DerivaBatch import load_jobs, run_batch, write_report
+from DerivaEngine import (Cancelled, ComputeJob, batch_rows, checkpoint, compile_batch, sample_grid,
+                          split_expressions, stack_rows, sweep_curves)
+from DerivaExport import DATA_FORMATS, array_chunks, column_names, engine_chunks, write_data
+from DerivaGuard import start_guard, stop_guard
+from DerivaRender import RECEIPT_GRAPH_BOX, figure_image, receipt_image
+from DerivaSampling import minmax_decimate, robust_limits
 
 # On this update: Resetbutton to red, link to guthib
 
+
+def plot_theme(background_color, text_color):
+    """Plot colors as property batches for each kind of artist.
+
+    Switching theme only sets these; the data and text layouts are left alone.
+    """
+    return {
+        "background": {"facecolor": background_color},
+        "text": {"color": text_color},
+        "spine": {"edgecolor": text_color},
+        "frame": {"facecolor": background_color, "edgecolor": text_color},
+        "key": {"color": text_color},
+        "ticks": {"colors": text_color},
+    }
+
+
+PLOT_THEMES = {"light": plot_theme("white", "black"), "dark": plot_theme("#242424", "white")}
+
+
 class FunctionVisualizerApp:
     def __init__(self, root):
         self.root = root
@@ -48,8 +73,49 @@ class FunctionVisualizerApp:
         
         self.graph_path = None
         self.fig = None
+        self.lines = []
+        self.legend_handles = []
+        self.colorbar = None
+        self.view_curves = None  # samples computed for a zoomed-in view, finer than full_curves
+        self.cursor_background = None
+        self.cursor_x = self.cursor_y = None
+        self.cursor_job = None
+        self.cursor_delay = 16  # ms, about one screen refresh
+        self.resample_job = None
+        self.resample_delay = 150  # ms to wait after the last zoom/pan event
+        self.max_samples = 10**8
+        self.full_curves = None
+
+        # Parameters (any name other than x) get a slider each
+        self.parameter_values = {}
+        self.parameter_range = (-5.0, 5.0)
+        self.parameter_delay = 30  # ms; slider drags fire many events
+        self.parameter_job = None
+        self.changed_parameters = set()
+        self.sliders = {}
+        self.sweep_count = 9
+        self.row_cache = None
+
+        # Plots are computed on a worker thread; the Tk thread polls for the result
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="DerivaPlot")
+        # Data files and reports get a thread of their own, so a long one never holds up Plot or zooming
+        self.file_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DerivaPlot-files")
+        # Expressions are test-parsed in a separate process first; start it while the window opens
+        start_guard()
+        self.job = None
+        self.updates = {}  # view and parameter updates running in the background, by kind
+        self.file_job = None  # a report or data file being written
+        self.file_job_title = None
+        self.poll_delay = 50  # ms between progress updates
+
+        # Live preview: typing starts the work Plot would do (coarse pass first) in the background
+        self.preview = None  # key, job, future and coarse result of the latest preview
+        self.preview_timer = None
+        self.preview_delay = 300  # ms to wait after the last keystroke
+        self.preview_samples = 256  # points in the coarse pass
         
         self.create_widgets()
+        self.last_input_text = self.input_text()
         
     def create_widgets(self):
         self.top_bar = ctk.CTkFrame(self.root)
@@ -77,12 +143,25 @@ class FunctionVisualizerApp:
         function_row.pack(fill="x", pady=3)
         
         ctk.CTkLabel(function_row, text="Function:", width=80).pack(side="left", padx=5)
-        self.entry_func = ctk.CTkEntry(function_row, width=300, placeholder_text="e.g., sin(x) + 0.5*x**4")
+        self.entry_func = ctk.CTkEntry(function_row, width=300, placeholder_text="e.g., sin(x) + 0.5*x**4; cos(x)")
         self.entry_func.pack(side="left", padx=5, fill="x", expand=True)
+        self.entry_func.bind("<KeyRelease>", self.on_input_edited)
+
+        # How derivatives and integrals are computed
+        ctk.CTkLabel(function_row, text="Engine:", width=60).pack(side="left", padx=5)
+        self.engine_var = ctk.StringVar(value="Symbolic")
+        self.engine_menu = ctk.CTkOptionMenu(
+            function_row,
+            values=["Symbolic", "Chebyshev", "Autodiff"],
+            variable=self.engine_var,
+            width=110
+        )
+        self.engine_menu.pack(side="left", padx=5)
         
         # Range input
         range_row = ctk.CTkFrame(self.input_frame)
         range_row.pack(fill="x", pady=3)
+        self.range_row = range_row
         
         ctk.CTkLabel(range_row, text="X Range:", width=80).pack(side="left", padx=5)
         self.entry_xmin = ctk.CTkEntry(range_row, width=80, placeholder_text="Min")
@@ -106,6 +185,28 @@ class FunctionVisualizerApp:
         self.entry_order = ctk.CTkEntry(range_row, width=50, placeholder_text="Order")
         self.entry_order.insert(0, "1")  # Default Valuer
         self.entry_order.pack(side="left", padx=5)
+
+        # Sample count (blank = adaptive sampling)
+        ctk.CTkLabel(range_row, text="Samples:", width=70).pack(side="left", padx=(15, 5))
+        self.entry_samples = ctk.CTkEntry(range_row, width=100, placeholder_text="Auto")
+        self.entry_samples.pack(side="left", padx=5)
+        for entry in (self.entry_xmin, self.entry_xmax, self.entry_order, self.entry_samples):
+            entry.bind("<KeyRelease>", self.on_input_edited)
+
+        # Accuracy vs. cost for derivatives SymPy cannot do exactly
+        ctk.CTkLabel(range_row, text="Numeric:", width=70).pack(side="left", padx=(15, 5))
+        self.numeric_var = ctk.StringVar(value="Balanced")
+        self.numeric_menu = ctk.CTkOptionMenu(
+            range_row,
+            values=["Fast", "Balanced", "Accurate"],
+            variable=self.numeric_var,
+            width=100
+        )
+        self.numeric_menu.pack(side="left", padx=5)
+
+        # Parameter sliders, only shown when the function has parameters
+        self.parameter_row = ctk.CTkFrame(self.input_frame)
+        self.sweep_var = ctk.StringVar(value="Off")
         
         # Action buttons
         button_row = ctk.CTkFrame(self.input_frame)
@@ -144,10 +245,45 @@ class FunctionVisualizerApp:
             height=button_height
         )
         self.btn_receipt.pack(side="left", padx=button_padding)
+
+        self.btn_data = ctk.CTkButton(
+            button_row, 
+            text="Save Data", 
+            command=self.on_save_data, 
+            state="disabled",
+            width=button_width,
+            height=button_height
+        )
+        self.btn_data.pack(side="left", padx=button_padding)
+
+        self.btn_report = ctk.CTkButton(
+            button_row, 
+            text="Batch Report", 
+            command=self.on_batch_report, 
+            width=button_width,
+            height=button_height
+        )
+        self.btn_report.pack(side="left", padx=button_padding)
+
+        self.btn_cancel = ctk.CTkButton(
+            button_row, 
+            text="Cancel", 
+            command=self.on_cancel, 
+            state="disabled",
+            width=button_width,
+            height=button_height
+        )
+        self.btn_cancel.pack(side="left", padx=button_padding)
+
+        # Input errors show up here while typing, instead of in a dialog
+        self.input_error_var = ctk.StringVar(value="")
+        ctk.CTkLabel(button_row, textvariable=self.input_error_var, anchor="w",
+                     text_color=self.reset_button_color).pack(side="left", fill="x", expand=True, padx=10)
         
         # Graph placeholder
         self.canvas_frame = ctk.CTkFrame(self.graph_frame)
         self.canvas_frame.pack(fill="both", expand=True, padx=5, pady=5)
+        self.create_plot_surface()
         
         # Status bar with link guthib
         status_bar_frame = ctk.CTkFrame(self.root)
@@ -158,6 +294,11 @@ class FunctionVisualizerApp:
         self.status_bar = ctk.CTkLabel(status_bar_frame, textvariable=self.status_var, anchor="w", height=20)
         self.status_bar.pack(side="left", fill="x", expand=True)
 
+        # Values under the mouse cursor
+        self.cursor_var = ctk.StringVar(value="")
+        ctk.CTkLabel(status_bar_frame, textvariable=self.cursor_var, anchor="e", height=20,
+                     font=("Courier", 12)).pack(side="left", padx=10)
+
         self.updates_link = ctk.CTkLabel(
             status_bar_frame, 
             text="Updates", 
@@ -186,30 +327,51 @@ class FunctionVisualizerApp:
     def update_plot_theme(self):
         """Update the plot theme to match the app theme"""
         if self.fig is not None:
-            background_color = "#242424" if self.appearance_mode == "dark" else "white"
-            text_color = "white" if self.appearance_mode == "dark" else "black"
-            
-            self.fig.patch.set_facecolor(background_color)
-            axes = self.fig.get_axes()
-            for ax in axes:
-                ax.set_facecolor(background_color)
-                ax.tick_params(colors=text_color)
-                ax.xaxis.label.set_color(text_color)
-                ax.yaxis.label.set_color(text_color)
-                ax.title.set_color(text_color)
-                for spine in ax.spines.values():
-                    spine.set_edgecolor(text_color)
-            # Update legend
+            # The cached cursor background is in the old colors; the next draw replaces it
+            self.hide_cursor()
+            self.pin_legend()
+            self.style_plot()
+            self.canvas.draw_idle()
+
+    def pin_legend(self):
+        """Keep the legend where the last draw put it.
+
+        Finding the 'best' spot tests every line against the legend box and is
+        most of the cost of a redraw; a restyle doesn't move the data, so the
+        answer would be the same. Zooming or panning lets it move again.
+        """
+        legend = self.ax.get_legend()
+        if legend is not None and not legend.stale:  # stale: not drawn yet, no position to keep
+            corner = legend.legendPatch.get_window_extent().p0
+            legend.set_loc(tuple(self.ax.transAxes.inverted().transform(corner)))
+
+    def themed_artists(self):
+        """(kind, artist) for everything in the figure that takes the theme's colors."""
+        yield "background", self.fig.patch
+        for ax in self.fig.get_axes():  # the plot and the sweep colorbar
+            yield "background", ax.patch
+            for text in (ax.title, ax.xaxis.label, ax.yaxis.label):
+                yield "text", text
+            for spine in ax.spines.values():
+                yield "spine", spine
             legend = ax.get_legend()
             if legend is not None:
-                frame = legend.get_frame()
-                frame.set_facecolor(background_color)
-                frame.set_edgecolor(text_color)
-
+                yield "frame", legend.get_frame()
                 for text in legend.get_texts():
-                    text.set_color(text_color)
-            
-            self.canvas.draw()
+                    yield "text", text
+                # The line style keys are drawn in the text color; the data lines keep theirs
+                for shown, handle in zip(legend.legend_handles, self.legend_handles):
+                    if handle not in self.lines:
+                        yield "key", shown
+
+    def style_plot(self):
+        """Apply the current theme's property batches to the figure (no drawing)."""
+        theme = PLOT_THEMES[self.appearance_mode]
+        for kind, artist in self.themed_artists():
+            artist.set(**theme[kind])
+        # Through the axis so ticks created later (zoom, pan) get the colors too
+        for ax in self.fig.get_axes():
+            ax.tick_params(**theme["ticks"])
 
     def show_help(self):
         """Display a help popup with information about the application"""
@@ -245,19 +407,43 @@ class FunctionVisualizerApp:
     Example: -10 to 10
 
     3. Set the derivative order (1 for first derivative, 2 for second, etc.)
+    Optionally set Samples for a fixed number of points (up to 100,000,000);
+    leave it blank for automatic sampling
 
     4. Click "Plot Functions" to visualize:
     - The original function
     - The specified derivative
     - The integral of the function
+    Long calculations show their progress below the plot; click "Cancel"
+    (or edit the function) to stop one
+    A preview is drawn while you type, so Plot usually has nothing left
+    to compute; input errors are shown next to the buttons
 
     5. Use the navigation toolbar to zoom, pan, or save the plot
+    (the curves are recomputed for the visible area)
 
     6. Click "Save Image" to export just the graph
     
     7. Click "Save Receipt" to create a complete report with the graph
     and function details
 
+    8. Click "Save Data" to save x, f, f^(n) and F as .npz, .npy or raw
+    columns, either the plotted points or any number of evenly spaced
+    points (computed piece by piece, so it can be more than fits in memory)
+
+    9. Click "Batch Report" to make receipts for a whole worksheet: pick a
+    CSV with the columns expression, x_min, x_max and optionally order,
+    samples and name, then a PDF (one page per function) or a folder name
+    for PNG receipts
+
+    Several functions can be compared at once by separating them with
+    semicolons or commas, e.g. sin(x); cos(x); x**2 / 4
+
+    Any other name in a function becomes a parameter with its own slider,
+    e.g. a*sin(b*x) + c; moving a slider updates the plot right away.
+    Pick a parameter under Sweep to draw a family of curves across its
+    slider range instead
+
     Supported mathematical functions:
     - Basic: +, -, *, /, **
     - Trigonometric: sin, cos, tan
@@ -267,8 +453,14 @@ class FunctionVisualizerApp:
     Tips:
 
     For complex functions, use parentheses to ensure proper order of operations
-    The derivative is calculated numerically, so very steep functions might show
-    some approximation errors
+    The derivative is calculated symbolically when possible, by automatic
+    differentiation when not, and numerically as a last resort, so very
+    complicated functions might show some approximation errors
+    (choose "Accurate" under Numeric to reduce them at some extra cost)
+    For smooth functions the Chebyshev engine gives derivatives and integrals
+    close to machine precision
+    The Autodiff engine skips symbolic differentiation, which helps with high
+    derivative orders of long expressions
     Toggle between light and dark themes using the theme button
     
     **Group Members:**  
@@ -290,38 +482,31 @@ class FunctionVisualizerApp:
         )
         close_button.pack(pady=10)
         
-    def validate_inputs(self):
-        """Validate all user inputs and check for empty fields."""
+    def check_inputs(self):
+        """Read and check the input fields (the expressions are compiled by plot_job).
+
+        Returns (expressions, x_range, order, sample_count); raises ValueError
+        with a message for the user.
+        """
         expr = self.entry_func.get().strip()
         x_min = self.entry_xmin.get().strip()
         x_max = self.entry_xmax.get().strip()
         order = self.entry_order.get().strip()
+        samples = self.entry_samples.get().strip()
         
         # Check for empty fields
         if not expr:
-            messagebox.showerror("Input Error", "Function expression cannot be empty")
-            return False, None, None, None
-        
+            raise ValueError("Function expression cannot be empty")
         if not x_min:
-            messagebox.showerror("Input Error", "Minimum x value cannot be empty")
-            return False, None, None, None
-            
+            raise ValueError("Minimum x value cannot be empty")
         if not x_max:
-            messagebox.showerror("Input Error", "Maximum x value cannot be empty")
-            return False, None, None, None
-            
+            raise ValueError("Maximum x value cannot be empty")
         if not order:
-            messagebox.showerror("Input Error", "Derivative order cannot be empty")
-            return False, None, None, None
+            raise ValueError("Derivative order cannot be empty")
             
         try:
-            x = sp.symbols('x')
-            # Convert the expression into a sympy function
-            sympy_expr = sp.sympify(expr, locals={"sin": sp.sin, "cos": sp.cos, "tan": sp.tan, 
-                                                "exp": sp.exp, "log": sp.log, "sqrt": sp.sqrt,
-                                                "pi": sp.pi, "e": sp.E})
-            # Convert to a lambda function that NumPy can evaluate
-            f = sp.lambdify(x, sympy_expr, 'numpy')
+            # Several functions can be overlaid ("sin(x); cos(x)")
+            expressions = split_expressions(expr)
             
             # Ensure numerical validity
             x_min_val = float(x_min)
@@ -333,163 +518,762 @@ class FunctionVisualizerApp:
             
             if order_val < 1:
                 raise ValueError("Derivative order must be at least 1")
-                
-            # Test the function with a sample value to catch potential errors
-            test_x = np.array([0.5])
-            try:
-                f(test_x)
-            except Exception:
-                raise ValueError("Function cannot be evaluated. Check your syntax.")
-            
-            return True, f, (x_min_val, x_max_val), order_val
+
+            # Blank means adaptive sampling
+            samples_val = int(float(samples)) if samples else None
+            if samples_val is not None and not 2 <= samples_val <= self.max_samples:
+                raise ValueError(f"Samples must be between 2 and {self.max_samples:,}")
         except Exception as e:
-            messagebox.showerror("Input Error", f"Invalid input: {e}")
+            raise ValueError(f"Invalid input: {e}")
+        return expressions, (x_min_val, x_max_val), order_val, samples_val
+
+    def validate_inputs(self):
+        """Validate all user inputs; problems are shown next to the buttons."""
+        try:
+            expressions, x_range, order_val, self.sample_count = self.check_inputs()
+        except ValueError as e:
+            self.input_error_var.set(str(e))
+            self.status_var.set("Input error")
             return False, None, None, None
+        self.input_error_var.set("")
+        return True, expressions, x_range, order_val
+
+    def compute_settings(self):
+        """Snapshot of the options a computation needs (widgets may only be read on the Tk thread)."""
+        return {
+            "numeric": self.numeric_var.get().lower(),
+            "engine": self.engine_var.get().lower(),
+            "sweep": self.sweep_parameter(),
+            "sweep_values": self.sweep_values(),
+            "parameters": dict(self.parameter_values),
+        }
             
-    def numerical_derivative(self, f, x_vals, order=1):
-        """Compute the numerical derivative of a function."""
-        if order == 1:
-            dx = x_vals[1] - x_vals[0]
-            return np.gradient(f(x_vals), dx)
+    def compute_curves(self, compiled, x_vals, order=1, lower=None, settings=None):
+        """Compute the functions, their derivatives and integrals (one row each), split at poles and jumps.
+
+        compiled is the unbound batch; settings (see compute_settings) supplies
+        the parameter values and options and is read from the widgets when not
+        given. In sweep mode there is one row per function and parameter value
+        instead. Returns (x_vals, y_vals, dydx_vals, integral_vals,
+        integral_error, rows), where rows are the per-function results that let
+        a slider recompute only the functions using it (None when sweeping).
+        """
+        settings = settings or self.compute_settings()
+        if settings["sweep"] in {symbol.name for symbol in compiled.parameters}:
+            # The whole family in one broadcast pass
+            *curves, integral_error = sweep_curves(
+                compiled, x_vals, settings["parameters"], settings["sweep"], settings["sweep_values"], order, lower,
+                numeric=settings["numeric"])
+            return (x_vals, *(c.reshape(-1, c.shape[-1]) for c in curves), integral_error, None)
+
+        # Symbolic derivative/antiderivative when they exist, numeric fallbacks otherwise
+        rows = batch_rows(compiled.bind(settings["parameters"]), x_vals, order, lower,
+                          numeric=settings["numeric"], engine=settings["engine"])
+        return (*stack_rows(x_vals, rows), rows)
+
+    def plot_job(self, expressions, x_range, order_val, sample_count, settings):
+        """Parse, compile, sample, differentiate and integrate; runs on a worker thread.
+
+        Only works on its arguments; show_plot applies the result on the Tk thread.
+        """
+        checkpoint("Compiling")
+        # Expressions seen before come from the compile cache
+        compiled = compile_batch(expressions)
+        parameters = {symbol.name: settings["parameters"].get(symbol.name, 1.0) for symbol in compiled.parameters}
+        settings = {**settings, "parameters": parameters}
+        bound = compiled.bind(parameters)
+
+        # Test the function with a sample value to catch potential errors
+        try:
+            bound.function(np.array([0.5]))
+        except Exception:
+            raise ValueError("Function cannot be evaluated. Check your syntax.")
+
+        checkpoint("Sampling")
+        if sample_count:
+            x_vals = np.linspace(x_range[0], x_range[1], sample_count)
         else:
-            # implementation for higher order derivatives
-            result = f(x_vals)
-            for _ in range(order):
-                dx = x_vals[1] - x_vals[0]
-                result = np.gradient(result, dx)
-            return result
+            # Coarse grid refined wherever the curves bend
+            x_vals = sample_grid(bound, x_range[0], x_range[1], order_val)
+
+        checkpoint("Differentiating and integrating")
+        plot_x, y_vals, dydx_vals, integral_vals, integral_error, rows = self.compute_curves(
+            compiled, x_vals, order_val, settings=settings)
+        return {
+            "compiled": compiled,
+            "bound": bound,
+            "expressions": expressions,
+            "parameters": parameters,
+            "base_x": x_vals,
+            "rows": rows,
+            # Full resolution is kept for export; only a min/max envelope is drawn
+            "full_curves": (plot_x, np.vstack([y_vals, dydx_vals, integral_vals])),
+            "integral_error": integral_error,
+        }
+
+    def preview_job(self, preview, expressions, x_range, order_val, sample_count, settings):
+        """A coarse plot_job, then the real one; runs on a worker thread.
+
+        The coarse result is left in preview["coarse"] for poll_preview to draw
+        while the full one is computed. The compile cache makes the second
+        compile free.
+        """
+        if not sample_count or sample_count > self.preview_samples:
+            preview["coarse"] = self.plot_job(expressions, x_range, order_val, self.preview_samples, settings)
+        return self.plot_job(expressions, x_range, order_val, sample_count, settings)
+
+    def job_key(self, expressions, x_range, order_val, sample_count, settings):
+        """Everything a plot_job result depends on, to tell whether a preview matches the inputs."""
+        return (tuple(expressions), x_range, order_val, sample_count, settings["numeric"], settings["engine"],
+                settings["sweep"], tuple(sorted(settings["parameters"].items())))
+
+    def input_text(self):
+        """The text of every input field, to tell edits from other key presses."""
+        return tuple(entry.get() for entry in (self.entry_func, self.entry_xmin, self.entry_xmax,
+                                               self.entry_order, self.entry_samples))
+
+    def on_input_edited(self, event=None):
+        """Restart the preview timer whenever the text changes; the preview starts once typing pauses.
+
+        Keys that change nothing (Tab, arrows, Shift, Ctrl-C) leave a running plot and preview alone.
+        """
+        text = self.input_text()
+        if text == self.last_input_text:
+            return
+        self.last_input_text = text
+        self.on_expression_edited()
+        if self.preview_timer is not None:
+            self.root.after_cancel(self.preview_timer)
+            self.preview_timer = None
+        if self.full_curves is None:  # no preview over a finished plot
+            self.preview_timer = self.root.after(self.preview_delay, self.update_preview)
+
+    def update_preview(self):
+        """Start computing a preview of the current inputs, unless one is running or done already."""
+        self.preview_timer = None
+        if not self.entry_func.get().strip():
+            self.cancel_preview()
+            self.input_error_var.set("")
+            self.clear_lines()
+            return
+        try:
+            expressions, x_range, order_val, sample_count = self.check_inputs()
+        except ValueError as e:
+            self.cancel_preview()
+            self.input_error_var.set(str(e))
+            return
+        self.input_error_var.set("")
+
+        settings = self.compute_settings()
+        key = self.job_key(expressions, x_range, order_val, sample_count, settings)
+        if self.preview is not None and self.preview["key"] == key:
+            return
+        self.cancel_preview()
+        job = ComputeJob()
+        preview = {"key": key, "job": job, "coarse": None, "drawn": None, "x_range": x_range, "order": order_val}
+        preview["future"] = self.executor.submit(job.run, self.preview_job, preview, expressions, x_range,
+                                                 order_val, sample_count, settings)
+        self.preview = preview
+        self.root.after(self.poll_delay, lambda: self.poll_preview(preview))
+
+    def poll_preview(self, preview):
+        """Draw the coarse pass as soon as it is there, then the full result (Tk thread)."""
+        if preview is not self.preview or self.full_curves is not None:
+            return
+        future = preview["future"]
+        result = future.result() if future.done() and future.exception() is None else preview["coarse"]
+        if result is not None and result is not preview["drawn"]:
+            preview["drawn"] = result
+            self.expressions = result["expressions"]
+            self.draw_curves(result["full_curves"], preview["x_range"], preview["order"])
+            self.status_var.set("Preview" if future.done() else "Preview (refining...)")
+        if not future.done():
+            self.root.after(self.poll_delay, lambda: self.poll_preview(preview))
+            return
+
+        try:
+            future.result()
+        except Cancelled:
+            pass
+        except Exception as e:
+            # One line fits next to the buttons; SymPy puts the actual problem last
+            message = str(e).strip().splitlines()[-1] if str(e).strip() else type(e).__name__
+            if preview["job"].stage == "Compiling":
+                self.input_error_var.set(f"Invalid input: {message}")
+            else:
+                self.input_error_var.set(f"Error calculating results: {message}")
+
+    def cancel_preview(self):
+        """Stop the running preview and forget its result."""
+        if self.preview is not None:
+            self.preview["job"].cancel()
+            self.preview = None
 
-    def numerical_integral(self, f, x_vals):
-        """Compute the numerical integral of a function."""
-        return np.array([quad(f, x_vals[0], x)[0] for x in x_vals])
-        
     def on_plot(self):
-        """Handle the plot button click."""
+        """Handle the plot button click: check the inputs, then compute in the background."""
+        is_valid, expressions, x_range, order_val = self.validate_inputs()
+        if not is_valid:
+            return
+
+        # A new plot supersedes whatever is still being computed
+        self.cancel_job()
+        self.cancel_updates()
+        if self.preview_timer is not None:
+            self.root.after_cancel(self.preview_timer)
+            self.preview_timer = None
+        self.last_input_text = self.input_text()
+        settings = self.compute_settings()
+        preview, self.preview = self.preview, None
+        if preview is not None and preview["key"] == self.job_key(
+                expressions, x_range, order_val, self.sample_count, settings):
+            # Typing already started (or finished) the same computation
+            job, future = preview["job"], preview["future"]
+        else:
+            if preview is not None:
+                preview["job"].cancel()
+            job = ComputeJob()
+            future = self.executor.submit(job.run, self.plot_job, expressions, x_range, order_val,
+                                          self.sample_count, settings)
+        self.job = job
+        self.btn_cancel.configure(state="normal")
+        self.status_var.set("Calculating...")
+        expr_text = self.entry_func.get()
+        self.poll_job(job, future, x_range, order_val, expr_text)
+
+    def poll_job(self, job, future, x_range, order_val, expr_text):
+        """Show the job's progress until it finishes, then hand its result to show_plot."""
+        if job is not self.job:
+            # Cancelled or superseded; whatever it returns is dropped
+            return
+        if not future.done():
+            self.status_var.set(f"Calculating... {job.stage} ({job.fraction:.0%})")
+            self.root.after(self.poll_delay, lambda: self.poll_job(job, future, x_range, order_val, expr_text))
+            return
+
+        self.job = None
+        if self.file_job is None:
+            self.btn_cancel.configure(state="disabled")
         try:
-            # Clear previous plot if exists
-            if hasattr(self, 'canvas'):
-                self.canvas.get_tk_widget().destroy()
-            if hasattr(self, 'toolbar'):
-                self.toolbar.destroy()
-            if hasattr(self, 'toolbar_frame'):
-                self.toolbar_frame.destroy()
-
-            # maintain size
-            self.canvas_frame.pack_forget()
-            self.canvas_frame = ctk.CTkFrame(self.graph_frame)
-            self.canvas_frame.pack(fill="both", expand=True, padx=5, pady=5)  
-            
-            # Validate inputs
-            is_valid, f, x_range, order_val = self.validate_inputs()
-            if not is_valid:
-                return
-            
-            self.status_var.set("Calculating and plotting...")
-            self.root.update()
-            
-            # Create plot
-            x_vals = np.linspace(x_range[0], x_range[1], 400)
-            
-            try:
-                y_vals = f(x_vals)
-                dydx_vals = self.numerical_derivative(f, x_vals, order_val)
-                integral_vals = self.numerical_integral(f, x_vals)
-                
-                # Create figure
-                plt.style.use('default')
-                self.fig, ax = plt.subplots(figsize=(8, 5))
-                
-                # Set colors based on theme
-                background_color = "#242424" if self.appearance_mode == "dark" else "white"
-                text_color = "white" if self.appearance_mode == "dark" else "black"
-                self.fig.patch.set_facecolor(background_color)
-                ax.set_facecolor(background_color)
-                
-                # Plot data
-                ax.plot(x_vals, y_vals, label=f'Function: {self.entry_func.get()}', linewidth=2)
-                ax.plot(x_vals, dydx_vals, label=f'{order_val}-Order Derivative', linestyle='dashed', linewidth=2)
-                ax.plot(x_vals, integral_vals, label='Integral', linestyle='dotted', linewidth=2)
-                
-                # Set labels and appearance
-                ax.set_xlabel('x', color=text_color)
-                ax.set_ylabel('y', color=text_color)
-                ax.set_title('Function, Derivative, and Integral', color=text_color)
-                ax.tick_params(colors=text_color)
-                for spine in ax.spines.values():
-                    spine.set_edgecolor(text_color)
-                
-                # Update legend
-                legend = ax.legend()
-                if legend is not None:
-                    frame = legend.get_frame()
-                    frame.set_facecolor(background_color)
-                    frame.set_edgecolor(text_color)
-                    for text in legend.get_texts():
-                        text.set_color(text_color)
-                        
-                ax.grid(True, alpha=0.3)
-                plt.tight_layout()
-                
-                # Display in UI
-                self.canvas = FigureCanvasTkAgg(self.fig, master=self.canvas_frame)
-                self.canvas.draw()
-                self.canvas.get_tk_widget().pack(fill="both", expand=True)
-                
-                # navigation toolbar
-                self.toolbar_frame = ctk.CTkFrame(self.canvas_frame)
-                self.toolbar_frame.pack(side="bottom", fill="x")
-                self.toolbar = NavigationToolbar2Tk(self.canvas, self.toolbar_frame)
-                self.toolbar.update()
-                
-                # Enable save buttons
-                self.btn_save.configure(state="normal")
-                self.btn_receipt.configure(state="normal")
-                
-                # Store data for receipt
-                self.current_data = {
-                    "expr": self.entry_func.get(),
-                    "x_range": x_range,
-                    "order": order_val
-                }
-
-                # reset
-                self.btn_plot.configure(
-                    text="Reset Plot", 
-                    command=self.on_reset_plot, 
-                    fg_color=self.reset_button_color,
-                    hover_color=self.reset_hover_color
-                )
-                
-                self.status_var.set("Plot completed successfully")
-            except Exception as e:
+            result = future.result()
+        except Cancelled:
+            self.status_var.set("Calculation cancelled")
+            return
+        except Exception as e:
+            if job.stage == "Compiling":
+                self.input_error_var.set(f"Invalid input: {e}")
+                self.status_var.set("Error occurred")
+            else:
                 messagebox.showerror("Calculation Error", f"Error calculating results: {e}")
                 self.status_var.set("Error in calculation")
-                
+            return
+
+        try:
+            self.show_plot(result, x_range, order_val, expr_text)
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {e}")
             self.status_var.set("Error occurred")
 
+    def cancel_job(self):
+        """Cancel the running computation, if any; the worker stops at its next checkpoint."""
+        if self.job is None:
+            return False
+        self.job.cancel()
+        self.job = None
+        if self.file_job is None:
+            self.btn_cancel.configure(state="disabled")
+        return True
+
+    def on_cancel(self):
+        """Handle the cancel button click."""
+        if self.file_job is not None:
+            self.file_job.cancel()
+            self.file_job = None
+            self.btn_report.configure(state="normal")
+            self.btn_data.configure(state="normal" if self.full_curves is not None else "disabled")
+            self.status_var.set(f"{self.file_job_title} cancelled")
+            if self.job is None:
+                self.btn_cancel.configure(state="disabled")
+        if self.cancel_job():
+            self.status_var.set("Calculation cancelled")
+
+    def on_expression_edited(self, event=None):
+        """A result for an expression that has since been edited is not worth waiting for."""
+        if self.cancel_job():
+            self.status_var.set("Calculation cancelled (expression changed)")
+
+    def show_plot(self, result, x_range, order_val, expr_text):
+        """Draw a finished plot_job result (Tk thread)."""
+        self.cancel_updates()  # they were for the previous plot
+        self.compiled = result["compiled"]
+        self.bound = result["bound"]
+        self.expressions = result["expressions"]
+        self.parameter_values.update(result["parameters"])
+        self.base_x = result["base_x"]
+        self.row_cache = result["rows"]
+        self.full_curves = result["full_curves"]
+        self.integral_error = result["integral_error"]
+        self.build_sliders(list(result["parameters"]))
+
+        self.draw_curves(self.full_curves, x_range, order_val)
+        
+        # Enable save buttons
+        self.btn_save.configure(state="normal")
+        self.btn_receipt.configure(state="normal")
+        if self.file_job is None:
+            self.btn_data.configure(state="normal")
+        
+        # Store data for receipt
+        self.current_data = {
+            "expr": expr_text,
+            "x_range": x_range,
+            "order": order_val,
+            "x_vals": self.full_curves[0]
+        }
+
+        # reset
+        self.btn_plot.configure(
+            text="Reset Plot", 
+            command=self.on_reset_plot, 
+            fg_color=self.reset_button_color,
+            hover_color=self.reset_hover_color
+        )
+        
+        self.status_var.set(f"Plot completed successfully (integral error ≤ {np.nanmax(self.integral_error):.1e})")
+
+    def draw_curves(self, full_curves, x_range, order_val):
+        """Show full_curves (rows as in plot_job's result) for self.expressions on the axes."""
+        # The figure, axes and lines stay; only their data, styles and limits change
+        ax = self.ax
+        self.hide_cursor()
+        self.view_curves = None
+        
+        # Plot data
+        plot_x, plot_curves = minmax_decimate(*full_curves, max(int(ax.bbox.width), 16))
+        self.legend_handles = self.plot_lines(ax, plot_x, plot_curves, order_val)
+
+        # Limits for the new data, without firing the zoom/pan re-sampling
+        margin = ax.margins()[0] * (x_range[1] - x_range[0])
+        ax.set_xlim(x_range[0] - margin, x_range[1] + margin, emit=False)
+        ax.relim(visible_only=True)
+        ax.set_autoscaley_on(True)
+        ax.autoscale_view(scalex=False)
+        # Don't let the values next to a pole flatten the rest of the plot
+        y_limits = robust_limits(*full_curves)
+        if y_limits is not None:
+            ax.set_ylim(*y_limits)
+        
+        # Update legend
+        ax.legend(handles=self.legend_handles)
+        self.style_plot()
+
+        # The new view becomes the toolbar's home
+        self.toolbar.update()
+        self.canvas.draw_idle()
+
+    def clear_lines(self):
+        """Empty the axes (they stay in place, ready for the next plot)."""
+        self.hide_cursor()
+        self.view_curves = None
+        for line in self.lines:
+            line.remove()
+        self.lines = []
+        if self.ax.get_legend() is not None:
+            self.ax.get_legend().remove()
+        self.remove_colorbar()
+        self.canvas.draw_idle()
+
+    def create_plot_surface(self):
+        """Build the figure, canvas and toolbar once; re-plots only update the lines on them."""
+        plt.style.use('default')
+        self.fig, self.ax = plt.subplots(figsize=(8, 5))
+        self.ax_spec = self.ax.get_subplotspec()  # the colorbar borrows from it while sweeping
+        ax = self.ax
+        
+        # Set labels and appearance
+        ax.set_xlabel('x')
+        ax.set_ylabel('y')
+        ax.set_title('Function, Derivative, and Integral')
+        ax.grid(True, alpha=0.3)
+        self.style_plot()
+        self.fig.tight_layout()
+        
+        # Display in UI
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self.canvas_frame)
+        self.canvas.draw()
+        self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        
+        # navigation toolbar
+        self.toolbar_frame = ctk.CTkFrame(self.canvas_frame)
+        self.toolbar_frame.pack(side="bottom", fill="x")
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.toolbar_frame)
+        self.toolbar.update()
+
+        # Re-sample the visible window whenever the view is zoomed or panned
+        ax.callbacks.connect('xlim_changed', self.on_view_changed)
+        self.create_cursor()
+
+    def create_cursor(self):
+        """Crosshair and marker dots drawn by blitting over a cached background, values in cursor_var.
+
+        The readout is a Tk label rather than matplotlib text: rendering text
+        through Agg would cost more than all the blitting put together.
+        """
+        ax = self.ax
+        # Animated artists are left out of normal draws; hidden ones are left out of relim
+        cursor_style = dict(color='gray', linewidth=0.8, linestyle=':', animated=True, visible=False)
+        self.cursor_vline = ax.axvline(0, **cursor_style)
+        self.cursor_hline = ax.axhline(0, **cursor_style)
+        self.cursor_dots = ax.scatter([], [], s=30, zorder=5, edgecolors='white', linewidths=0.8,
+                                      animated=True, visible=False)
+        self.cursor_artists = (self.cursor_vline, self.cursor_hline, self.cursor_dots)
+
+        self.canvas.mpl_connect('draw_event', self.on_canvas_drawn)
+        self.canvas.mpl_connect('motion_notify_event', self.on_cursor_moved)
+        self.canvas.mpl_connect('axes_leave_event', self.hide_cursor)
+        self.canvas.mpl_connect('figure_leave_event', self.hide_cursor)
+
+    def on_canvas_drawn(self, event):
+        """Cache the freshly drawn plot (without the cursor) to blit the cursor onto."""
+        if event.canvas is not self.canvas:  # drawn off-screen, e.g. for a receipt
+            return
+        self.cursor_background = self.canvas.copy_from_bbox(self.ax.bbox)
+
+    def on_cursor_moved(self, event):
+        """Remember where the mouse is; the cursor is redrawn at most once per screen refresh."""
+        if (event.inaxes is not self.ax or self.full_curves is None or self.toolbar.mode
+                or self.cursor_background is None):
+            self.hide_cursor()
+            return
+        self.cursor_x, self.cursor_y = event.xdata, event.ydata
+        if self.cursor_job is None:
+            self.cursor_job = self.root.after(self.cursor_delay, self.draw_cursor)
+
+    def cursor_values(self, x_val):
+        """Every curve at x_val, interpolated in the cached samples (nothing is re-evaluated)."""
+        x_vals, curves = self.full_curves
+        if self.view_curves is not None and self.view_curves[0][0] <= x_val <= self.view_curves[0][-1]:
+            x_vals, curves = self.view_curves
+        i = int(np.clip(np.searchsorted(x_vals, x_val), 1, x_vals.size - 1))
+        t = (x_val - x_vals[i - 1]) / (x_vals[i] - x_vals[i - 1])
+        # A gap sample (NaN) on either side keeps the value undefined
+        return curves[:, i - 1] + t * (curves[:, i] - curves[:, i - 1])
+
+    def draw_cursor(self):
+        self.cursor_job = None
+        if self.cursor_x is None or self.cursor_background is None or self.full_curves is None:
+            return
+        x_val = self.cursor_x
+        values = self.cursor_values(x_val)
+        order_val = self.current_data['order']
+
+        self.cursor_vline.set_xdata([x_val, x_val])
+        self.cursor_hline.set_ydata([self.cursor_y, self.cursor_y])
+        self.cursor_dots.set_offsets(np.column_stack([np.full(values.size, x_val), values]))
+        self.cursor_dots.set_facecolors([line.get_color() for line in self.lines])
+
+        # f, f^(n) and F per function (only the first few when sweeping)
+        count = values.size // 3
+        rows = values.reshape(3, count).T
+        names = self.expressions if count == len(self.expressions) else [f"#{k + 1}" for k in range(count)]
+        parts = [f"x = {x_val:.6g}"]
+        for name, (f_val, d_val, i_val) in list(zip(names, rows))[:3]:
+            prefix = f"{name}: " if count > 1 else ""
+            parts.append(f"{prefix}f = {f_val:.6g}, f^({order_val}) = {d_val:.6g}, F = {i_val:.6g}")
+        if count > 3:
+            parts.append(f"{count - 3} more")
+        self.cursor_var.set("  |  ".join(parts))
+
+        self.canvas.restore_region(self.cursor_background)
+        for artist in self.cursor_artists:
+            artist.set_visible(True)
+            self.ax.draw_artist(artist)
+        self.canvas.blit(self.ax.bbox)
+
+    def hide_cursor(self, event=None):
+        """Take the cursor off the plot by blitting the cached background back."""
+        self.cursor_x = None
+        if not self.cursor_vline.get_visible():
+            return
+        self.cursor_var.set("")
+        for artist in self.cursor_artists:
+            artist.set_visible(False)
+        if self.cursor_background is not None:
+            self.canvas.restore_region(self.cursor_background)
+            self.canvas.blit(self.ax.bbox)
+
+    def plot_lines(self, ax, x_vals, curves, order_val):
+        """Point the lines at all functions, then all derivatives, then all integrals (the row order of full_curves).
+
+        Existing Line2D objects are reused; lines are only added or removed when
+        the number of curves changes. Returns the legend handles.
+        """
+        count = len(self.expressions)
+        sweep = self.sweep_parameter()
+        text_color = PLOT_THEMES[self.appearance_mode]["key"]["color"]
+        if sweep:
+            # Color runs along the swept parameter; line style tells the curves apart
+            colors = plt.cm.viridis(np.linspace(0, 1, self.sweep_count))
+            styles = [dict(color=colors[k], linestyle=linestyle, linewidth=1.5)
+                      for linestyle in ('solid', 'dashed', 'dotted')
+                      for _ in range(count) for k in range(self.sweep_count)]
+        elif count == 1:
+            styles = [dict(label=f'Function: {self.expressions[0]}', color='C0'),
+                      dict(label=f'{order_val}-Order Derivative', color='C1', linestyle='dashed'),
+                      dict(label='Integral', color='C2', linestyle='dotted')]
+        else:
+            # One color per function, one line style per kind of curve
+            styles = [dict(label=expr, color=f'C{i % 10}') for i, expr in enumerate(self.expressions)]
+            styles += [dict(color=f'C{i % 10}', linestyle='dashed') for i in range(count)]
+            styles += [dict(color=f'C{i % 10}', linestyle='dotted') for i in range(count)]
+
+        while len(self.lines) < len(styles):
+            line, = ax.plot([], [])
+            self.lines.append(line)
+        for line in self.lines[len(styles):]:
+            line.remove()
+        del self.lines[len(styles):]
+        for line, vals, style in zip(self.lines, curves, styles):
+            line.set_data(x_vals, vals)
+            line.update({'linewidth': 2, 'linestyle': 'solid', 'label': '_nolegend_', **style})
+        handles = [line for line, style in zip(self.lines, styles) if 'label' in style]
+
+        # Legend keys for the line styles (they hold no data and are not drawn on the axes)
+        if sweep:
+            handles.append(Line2D([], [], color=text_color, label=f'Function: {"; ".join(self.expressions)}'))
+        if sweep or count > 1:
+            handles.append(Line2D([], [], color=text_color, linestyle='dashed', label=f'{order_val}-Order Derivatives'))
+            handles.append(Line2D([], [], color=text_color, linestyle='dotted', label='Integrals'))
+
+        # The colorbar takes room from the axes, so the layout only changes when it comes or goes
+        if sweep and self.colorbar is None:
+            mappable = plt.cm.ScalarMappable(norm=plt.Normalize(*self.parameter_range), cmap='viridis')
+            self.colorbar = self.fig.colorbar(mappable, ax=ax)
+            self.fig.tight_layout()
+        elif not sweep:
+            self.remove_colorbar()
+        if sweep:
+            self.colorbar.set_label(sweep)  # colored with the rest by style_plot
+        return handles
+
+    def remove_colorbar(self):
+        """Drop the sweep colorbar and give its room back to the axes."""
+        if self.colorbar is None:
+            return
+        self.colorbar.remove()
+        self.colorbar = None
+        self.ax.set_subplotspec(self.ax_spec)
+        self.fig.tight_layout()
+
+    def on_view_changed(self, ax):
+        """Debounce zoom/pan events before re-sampling the visible window."""
+        legend = ax.get_legend()
+        if legend is not None:
+            legend.set_loc('best')  # unpin, the data moves under it
+        if self.resample_job is not None:
+            self.root.after_cancel(self.resample_job)
+        self.resample_job = self.root.after(self.resample_delay, lambda: self.resample_view(ax))
+
+    def resample_view(self, ax):
+        """Re-evaluate the cached kernels over the visible x range at screen resolution.
+
+        When the computed samples are too sparse for the view, their envelope
+        is drawn at once and finer samples are computed in the background.
+        """
+        self.resample_job = None
+        if self.full_curves is None or ax is not self.ax:
+            return
+
+        x_min, x_max = sorted(ax.get_xlim())
+        pixels = max(int(ax.bbox.width), 16)
+        order_val = self.current_data['order']
+        x_full, curves_full = self.full_curves
+
+        self.view_curves = None
+        self.show_view(ax, minmax_decimate(x_full, curves_full, pixels, x_min, x_max))
+        if np.searchsorted(x_full, x_max) - np.searchsorted(x_full, x_min) >= pixels:
+            # The computed samples still resolve the view; their min/max envelope is all it takes
+            self.cancel_updates("view")
+        else:
+            # Integral stays measured from the plotted range's left edge
+            self.start_update("view", self.view_job,
+                              (self.compiled, self.bound, (x_min, x_max), order_val, pixels,
+                               self.current_data['x_range'][0], self.compute_settings()),
+                              lambda result: self.show_view(ax, result, finer=True))
+
+    def view_job(self, compiled, bound, x_range, order_val, pixels, lower, settings):
+        """Sample and evaluate the visible window at screen resolution; runs on a worker thread."""
+        x_vals = sample_grid(bound, x_range[0], x_range[1], order_val, initial=pixels, max_points=4 * pixels)
+        x_vals, *curves, _, _ = self.compute_curves(compiled, x_vals, order_val, lower=lower, settings=settings)
+        return x_vals, np.vstack(curves)
+
+    def show_view(self, ax, view, finer=False):
+        """Point the lines at the samples for the current view (Tk thread)."""
+        if ax is not self.ax or self.full_curves is None:
+            return
+        if finer:
+            # Finer than full_curves here, so the cursor readout uses it
+            self.view_curves = view
+        x_vals, curves = view
+        for line, vals in zip(self.lines, curves):
+            line.set_data(x_vals, vals)
+        self.canvas.draw_idle()
+
+    def build_sliders(self, names):
+        """Show one slider per parameter (plus the sweep choice), or hide the row when there are none."""
+        if list(self.sliders) == list(names):
+            return
+        for widget in self.parameter_row.winfo_children():
+            widget.destroy()
+        self.sliders = {}
+        if not names:
+            self.parameter_row.pack_forget()
+            return
+
+        for name in names:
+            ctk.CTkLabel(self.parameter_row, text=f"{name}:", width=30).pack(side="left", padx=(10, 2))
+            slider = ctk.CTkSlider(
+                self.parameter_row,
+                from_=self.parameter_range[0],
+                to=self.parameter_range[1],
+                number_of_steps=200,
+                width=120,
+                command=lambda value, name=name: self.on_parameter_changed(name, value)
+            )
+            slider.set(self.parameter_values[name])
+            slider.pack(side="left", padx=2)
+            value_label = ctk.CTkLabel(self.parameter_row, text=f"{self.parameter_values[name]:.2f}", width=40)
+            value_label.pack(side="left", padx=2)
+            self.sliders[name] = (slider, value_label)
+
+        # Sweep draws one curve per value of a parameter across its slider range
+        ctk.CTkLabel(self.parameter_row, text="Sweep:", width=50).pack(side="left", padx=(15, 5))
+        if self.sweep_var.get() not in names:
+            self.sweep_var.set("Off")
+        ctk.CTkOptionMenu(
+            self.parameter_row,
+            values=["Off", *names],
+            variable=self.sweep_var,
+            command=self.on_sweep_changed,
+            width=70
+        ).pack(side="left", padx=5)
+        self.parameter_row.pack(fill="x", pady=3, after=self.range_row)
+
+    def sweep_parameter(self):
+        """Name of the swept parameter, or None when not sweeping."""
+        name = self.sweep_var.get()
+        return name if name in self.sliders else None
+
+    def sweep_values(self):
+        return np.linspace(*self.parameter_range, self.sweep_count)
+
+    def on_parameter_changed(self, name, value):
+        """Slider moved: remember the value and schedule an update of the existing lines."""
+        self.parameter_values[name] = float(value)
+        self.sliders[name][1].configure(text=f"{float(value):.2f}")
+        if self.full_curves is None or name == self.sweep_parameter():
+            return
+        self.changed_parameters.add(name)
+        if self.parameter_job is not None:
+            self.root.after_cancel(self.parameter_job)
+        self.parameter_job = self.root.after(self.parameter_delay, self.update_parameters)
+
+    def on_sweep_changed(self, choice):
+        """Sweeping changes which lines exist, so re-plot."""
+        if self.full_curves is not None:
+            self.on_plot()
+
+    def update_parameters(self):
+        """Re-evaluate only the functions that use the changed parameters in the background."""
+        self.parameter_job = None
+        if self.full_curves is None:
+            return
+        # Changes stay pending until applied, so an update superseded by a newer one loses none
+        changed = set(self.changed_parameters)
+        settings = self.compute_settings()
+        self.start_update("parameters", self.parameter_update_job,
+                          (self.compiled, self.base_x, self.current_data['order'], self.row_cache, changed, settings),
+                          lambda result: self.show_parameters(result, changed, settings))
+
+    def parameter_update_job(self, compiled, base_x, order_val, row_cache, changed, settings):
+        """New curves for changed parameter values; runs on a worker thread."""
+        bound = compiled.bind(settings["parameters"])
+        if settings["sweep"]:
+            x_vals, *curves, integral_error, _ = self.compute_curves(compiled, base_x, order_val, settings=settings)
+        else:
+            affected = [i for i, member in enumerate(compiled.members)
+                        if changed & {symbol.name for symbol in member.parameters}]
+            rows = batch_rows(bound.subset(affected), base_x, order_val,
+                              numeric=settings["numeric"], engine=settings["engine"]) if affected else []
+            row_cache = list(row_cache)
+            for i, row in zip(affected, rows):
+                row_cache[i] = row
+            x_vals, *curves, integral_error = stack_rows(base_x, row_cache)
+        return {"bound": bound, "rows": row_cache, "full_curves": (x_vals, np.vstack(curves)),
+                "integral_error": integral_error}
+
+    def show_parameters(self, result, changed, settings):
+        """Apply a parameter_update_job result and refresh the lines (Tk thread)."""
+        self.changed_parameters -= changed
+        self.bound = result["bound"]
+        self.row_cache = result["rows"]
+        self.full_curves = result["full_curves"]
+        self.integral_error = result["integral_error"]
+        self.resample_view(self.ax)
+        values = ", ".join(f"{name} = {settings['parameters'][name]:.2f}" for name in self.sliders)
+        self.status_var.set(f"Updated {values} (integral error ≤ {np.nanmax(self.integral_error):.1e})")
+
+    def start_update(self, kind, work, args, apply):
+        """Run a view or parameter update on the worker thread, replacing any update of the same kind.
+
+        apply gets the result on the Tk thread unless a newer update or a new
+        plot has superseded it by then.
+        """
+        self.cancel_updates(kind)
+        job = ComputeJob()
+        future = self.executor.submit(job.run, work, *args)
+        self.updates[kind] = job
+        self.poll_update(kind, job, future, apply)
+
+    def poll_update(self, kind, job, future, apply):
+        if self.updates.get(kind) is not job:
+            return
+        if not future.done():
+            self.root.after(self.poll_delay, lambda: self.poll_update(kind, job, future, apply))
+            return
+
+        del self.updates[kind]
+        try:
+            result = future.result()
+        except Cancelled:
+            return
+        except Exception as e:
+            self.status_var.set(f"Error updating {kind}: {e}")
+            return
+        apply(result)
+
+    def cancel_updates(self, kind=None):
+        """Cancel the running update of this kind (all of them when kind is None)."""
+        for name in list(self.updates) if kind is None else [kind]:
+            job = self.updates.pop(name, None)
+            if job is not None:
+                job.cancel()
+
     def on_reset_plot(self):
         """Reset the plot and input fields."""
+        self.cancel_job()
+        self.cancel_updates()
         # Clear input fields
         self.entry_func.delete(0, "end")
         self.entry_xmin.delete(0, "end")
         self.entry_xmax.delete(0, "end")
         self.entry_order.delete(0, "end")
         self.entry_order.insert(0, "1") 
+        self.entry_samples.delete(0, "end")
         
-        # Clear the plot
-        if hasattr(self, 'canvas'):
-            self.canvas.get_tk_widget().destroy()
-        if hasattr(self, 'toolbar'):
-            self.toolbar.destroy()
-        if hasattr(self, 'toolbar_frame'):
-            self.toolbar_frame.destroy()
-        
-        # Recreate the canvas frame
-        self.canvas_frame.pack_forget()
-        self.canvas_frame = ctk.CTkFrame(self.graph_frame)
-        self.canvas_frame.pack(fill="both", expand=True, padx=5, pady=5)
+        # Clear the plot (the empty axes stay in place)
+        self.cancel_preview()
+        self.input_error_var.set("")
+        self.clear_lines()
         
         # Reset the plot button
         self.btn_plot.configure(
@@ -502,15 +1286,21 @@ class FunctionVisualizerApp:
         # Disable save buttons
         self.btn_save.configure(state="disabled")
         self.btn_receipt.configure(state="disabled")
+        if self.file_job is None:
+            self.btn_data.configure(state="disabled")
         
         # Reset status
         self.status_var.set("Ready to plot")
 
-        self.fig = None
+        self.full_curves = None
+        self.row_cache = None
+        self.parameter_values = {}
+        self.sweep_var.set("Off")
+        self.build_sliders([])
     
     def on_save_image(self):
         """Save the current plot as an image."""
-        if self.fig is None:
+        if self.full_curves is None:
             messagebox.showerror("Error", "No plot to save")
             return
             
@@ -527,9 +1317,146 @@ class FunctionVisualizerApp:
             except Exception as e:
                 messagebox.showerror("Save Error", f"Error saving image: {e}")
     
+    def on_batch_report(self):
+        """Receipts for every function in a job file, as one PDF or a folder of PNGs (in the background)."""
+        jobs_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
+        if not jobs_path:
+            return
+        try:
+            jobs = load_jobs(jobs_path)
+        except Exception as e:
+            messagebox.showerror("Report Error", f"Error reading {os.path.basename(jobs_path)}: {e}")
+            return
+        if not jobs:
+            messagebox.showerror("Report Error", "The file has no functions in it")
+            return
+
+        report_path = filedialog.asksaveasfilename(
+            defaultextension=".pdf",
+            filetypes=[("PDF report", "*.pdf"), ("PNG receipts (folder)", "*")]
+        )
+        if not report_path:
+            return
+
+        settings = (self.numeric_var.get().lower(), self.engine_var.get().lower())
+        if report_path.lower().endswith(".pdf"):
+            args = (write_report, jobs, report_path, None, *settings)
+        else:
+            args = (run_batch, jobs, report_path, ["receipt"], None, *settings)
+
+        def finished(reports):
+            failed = [item for item in reports if item["error"] is not None]
+            self.status_var.set(f"Report saved to {os.path.basename(report_path)} "
+                                f"({len(reports) - len(failed)} of {len(reports)} receipts)")
+            if failed:
+                details = "\n".join(f"{item['name']}: {item['error']}" for item in failed[:10])
+                messagebox.showerror("Report Error", f"{len(failed)} functions could not be plotted:\n{details}")
+
+        self.start_file_job("Report", args, finished)
+
+    def on_save_data(self):
+        """Save x, f, f^(n) and F as binary columns: the plotted points, or any number of evenly spaced ones."""
+        if self.full_curves is None:
+            messagebox.showerror("Error", "No data to save")
+            return
+
+        data_path = filedialog.asksaveasfilename(
+            defaultextension=".npz",
+            filetypes=[("NumPy archive, one array per column", "*.npz"), ("NumPy array (columns, rows)", "*.npy"),
+                       ("Raw little-endian float64 with a JSON header", "*.raw")]
+        )
+        if not data_path:
+            return
+        if os.path.splitext(data_path)[1].lower() not in DATA_FORMATS:
+            messagebox.showerror("Save Error", "Data files must end in .npz, .npy or .raw")
+            return
+
+        if self.sweep_parameter():
+            # The evenly spaced points are evaluated for the slider values only, so a sweep saves what is plotted
+            points = ""
+        else:
+            dialog = ctk.CTkInputDialog(title="Save Data",
+                                        text="Points to save, evenly spaced (blank: the plotted points):")
+            points = dialog.get_input()
+            if points is None:
+                return  # dialog cancelled
+            points = points.strip()
+        order_val = self.current_data['order']
+        metadata = {"expressions": self.expressions, "order": order_val,
+                    "x_range": list(self.current_data['x_range']), "parameters": dict(self.parameter_values)}
+        try:
+            if points:
+                # Evaluated a piece at a time straight into the file, so the count can exceed memory
+                samples = int(float(points))
+                if samples < 2:
+                    raise ValueError("Save at least 2 points")
+                names = column_names(self.expressions, order_val)
+                chunks = engine_chunks(self.bound, self.current_data['x_range'], order_val, samples,
+                                       self.numeric_var.get().lower(), self.engine_var.get().lower())
+            else:
+                x_vals, curves = self.full_curves
+                samples = x_vals.size
+                if self.sweep_parameter():
+                    # One row per function and parameter value; no per-function column names
+                    names = ["x"] + [f"{kind}_{k + 1}" for kind in ("f", f"d{order_val}f", "F")
+                                     for k in range(len(curves) // 3)]
+                    metadata["sweep"] = {"parameter": self.sweep_parameter(), "values": self.sweep_values().tolist()}
+                else:
+                    names = column_names(self.expressions, order_val)
+                    # full_curves holds all functions, then all derivatives, then all integrals
+                    curves = curves.reshape(3, -1, samples).transpose(1, 0, 2).reshape(-1, samples)
+                chunks = array_chunks([x_vals, *curves])
+        except ValueError as e:
+            messagebox.showerror("Save Error", f"Invalid number of points: {e}")
+            return
+
+        def finished(result):
+            self.status_var.set(f"Data saved to {os.path.basename(data_path)} ({samples:,} points)")
+
+        self.start_file_job("Saving data", (write_data, data_path, names, samples, chunks, metadata), finished)
+
+    def start_file_job(self, title, call, finished):
+        """Run call (a function and its arguments) on the file worker thread; Cancel stops it.
+
+        finished gets its result on the Tk thread. Only one such job runs at a time.
+        """
+        job = ComputeJob()
+        future = self.file_executor.submit(job.run, *call)
+        self.file_job = job
+        self.btn_report.configure(state="disabled")
+        self.btn_data.configure(state="disabled")
+        self.btn_cancel.configure(state="normal")
+        self.file_job_title = title
+        self.poll_file_job(job, future, title, finished)
+
+    def poll_file_job(self, job, future, title, finished):
+        """Show how far the job is until it is done."""
+        if job is not self.file_job:
+            return
+        if not future.done():
+            self.status_var.set(f"{title}... {job.stage}")
+            self.root.after(self.poll_delay, lambda: self.poll_file_job(job, future, title, finished))
+            return
+
+        self.file_job = None
+        self.btn_report.configure(state="normal")
+        self.btn_data.configure(state="normal" if self.full_curves is not None else "disabled")
+        if self.job is None:
+            self.btn_cancel.configure(state="disabled")
+        try:
+            result = future.result()
+        except Cancelled:
+            self.status_var.set(f"{title} cancelled")
+            return
+        except Exception as e:
+            messagebox.showerror("Save Error", f"{title} failed: {e}")
+            self.status_var.set("Error occurred")
+            return
+        finished(result)
+
     def on_save_receipt(self):
         """Save a receipt with function details and the graph."""
-        if self.fig is None or not hasattr(self, 'current_data'):
+        if self.full_curves is None or not hasattr(self, 'current_data'):
             messagebox.showerror("Error", "No data to save")
             return
             
@@ -541,44 +1468,11 @@ class FunctionVisualizerApp:
         if not receipt_path:
             return
         
-        temp_path = None
-
         try:
-            # Create receipt image
-            receipt_width, receipt_height = 600, 630
-            image = Image.new('RGB', (receipt_width, receipt_height), 'white')
-            draw = ImageDraw.Draw(image)
-
-            try:
-                font_title = ImageFont.truetype("arial", 24)
-                font_text = ImageFont.truetype("arial", 16)
-            except:
-                font_title = ImageFont.load_default()
-                font_text = ImageFont.load_default()
-            
-            # Add header
-            draw.text((30, 30), "Function Visualizer Receipt", fill="black", font=font_title)
-            draw.text((30, 80), f"Function: {self.current_data['expr']}", fill="black", font=font_text)
-            draw.text((30, 110), f"X Range: [{self.current_data['x_range'][0]}, {self.current_data['x_range'][1]}]", 
-                    fill="black", font=font_text)
-            draw.text((30, 140), f"Derivative Order: {self.current_data['order']}", fill="black", font=font_text)
-            draw.text((30, 170), f"Date: {np.datetime64('today')}", fill="black", font=font_text)
-            
-            # temp file
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                temp_path = temp_file.name
-                self.fig.savefig(temp_path, dpi=150, bbox_inches='tight')
-            
-            # graph to receipt
-            graph_img = Image.open(temp_path)
-            graph_img = graph_img.resize((520, 380), Image.LANCZOS)
-            image.paste(graph_img, (40, 200))
-            
-            # Footer
-            footer_text = "Thank you for using DerivaPlot"
-
-            draw.text((30, 600), footer_text, fill="black", font=font_text)
-
+            # The graph is drawn straight at its size on the receipt; nothing goes through a file
+            graph = figure_image(self.fig, size=RECEIPT_GRAPH_BOX[2:])
+            image = receipt_image(graph, self.current_data['expr'], self.current_data['x_range'],
+                                  self.current_data['order'])
             
             # Save receipt
             image.save(receipt_path)
@@ -588,10 +1482,6 @@ class FunctionVisualizerApp:
             
         except Exception as e:
             messagebox.showerror("Save Error", f"Error saving receipt: {e}")
-        finally:
-            # temp file cleannerr
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
 
     def open_updates_link(self):
         """Open the updates webpage in the default browser"""
@@ -600,6 +1490,14 @@ class FunctionVisualizerApp:
     
     def on_closing(self):
         """Handle window closing."""
+        self.cancel_job()
+        self.cancel_updates()
+        self.cancel_preview()
+        if self.file_job is not None:
+            self.file_job.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.file_executor.shutdown(wait=False, cancel_futures=True)
+        stop_guard()
         plt.close('all')  # Close all matplotlib
         self.root.destroy()
 
@@ -610,4 +1508,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Lets frozen builds start the expression guard's worker process
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
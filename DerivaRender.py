@@ -0,0 +1,189 @@
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image, ImageDraw, ImageFont
+
+from DerivaSampling import minmax_decimate, robust_limits
+
+# Window-free rendering of plots and receipts (Agg canvas, PIL images in memory)
+
+RECEIPT_SIZE = (600, 630)
+RECEIPT_GRAPH_BOX = (40, 200, 520, 380)  # left, top, width, height
+RECEIPT_FOOTER = "Thank you for using DerivaPlot"
+
+
+def plot_figure(x_vals, curves, expressions, order, figsize=(8, 5), dpi=150):
+    """The app's light-theme plot of function, derivative and integral rows on an Agg canvas.
+
+    curves holds all functions, then all derivatives, then all integrals, one
+    row each, like full_curves in the app.
+    """
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    curves = np.atleast_2d(curves)
+
+    plot_x, plot_curves = minmax_decimate(x_vals, curves, int(figsize[0] * dpi))
+    count = len(expressions)
+    if count == 1:
+        styles = [dict(label=f'Function: {expressions[0]}'),
+                  dict(label=f'{order}-Order Derivative', linestyle='dashed'),
+                  dict(label='Integral', linestyle='dotted')]
+    else:
+        styles = [dict(label=expr, color=f'C{i % 10}') for i, expr in enumerate(expressions)]
+        styles += [dict(color=f'C{i % 10}', linestyle='dashed') for i in range(count)]
+        styles += [dict(color=f'C{i % 10}', linestyle='dotted') for i in range(count)]
+    for vals, style in zip(plot_curves, styles):
+        ax.plot(plot_x, vals, **{'linewidth': 2, **style})
+    if count > 1:
+        # Legend keys for the line styles (they hold no data)
+        ax.plot([], [], color='black', linestyle='dashed', label=f'{order}-Order Derivatives')
+        ax.plot([], [], color='black', linestyle='dotted', label='Integrals')
+
+    y_limits = robust_limits(x_vals, curves)
+    if y_limits is not None:
+        ax.set_ylim(*y_limits)
+    ax.set_xlabel('x')
+    ax.set_ylabel('y')
+    ax.set_title('Function, Derivative, and Integral')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    return fig
+
+
+def figure_image(fig, dpi=150, size=None):
+    """Render a figure straight into a PIL image (no temporary file, no PNG round-trip).
+
+    size (width, height in pixels) draws the figure at exactly that size,
+    scaling the dpi with the width, so the image needs no resizing. The figure
+    is drawn on a canvas of its own; the one it is shown on (e.g. the app's
+    window) and its size and dpi are left as they were.
+    """
+    canvas, original_dpi, original_size = fig.canvas, fig.dpi, fig.get_size_inches()
+    FigureCanvasAgg(fig)
+    try:
+        if size is not None:
+            dpi = size[0] / original_size[0]
+            fig.set_size_inches(size[0] / dpi, size[1] / dpi)
+        fig.set_dpi(dpi)
+        fig.canvas.draw()
+        return Image.fromarray(np.asarray(fig.canvas.buffer_rgba())).convert('RGB')
+    finally:
+        fig.set_dpi(original_dpi)
+        fig.set_size_inches(original_size)
+        fig.set_canvas(canvas)
+
+
+@lru_cache(maxsize=None)
+def _fonts():
+    try:
+        return ImageFont.truetype("arial", 24), ImageFont.truetype("arial", 16)
+    except OSError:
+        return ImageFont.load_default(), ImageFont.load_default()
+
+
+@lru_cache(maxsize=None)
+def _receipt_template(size, footer):
+    """The parts of the receipt that are the same on every receipt (drawn once per process)."""
+    image = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(image)
+    font_title, font_text = _fonts()
+    draw.text((30, 30), "Function Visualizer Receipt", fill="black", font=font_title)
+    draw.text((30, 600), footer, fill="black", font=font_text)
+    return image
+
+
+def receipt_image(graph, expr, x_range, order, date=None, size=RECEIPT_SIZE, footer=RECEIPT_FOOTER):
+    """The app's receipt: function details above the graph image, as a PIL image.
+
+    graph is resized to fit unless it already has the size of RECEIPT_GRAPH_BOX
+    (see figure_image's size). size and footer let an app keep a taller
+    receipt with a longer footer.
+    """
+    image = _receipt_template(tuple(size), footer).copy()
+    draw = ImageDraw.Draw(image)
+    _, font_text = _fonts()
+
+    draw.text((30, 80), f"Function: {expr}", fill="black", font=font_text)
+    draw.text((30, 110), f"X Range: [{x_range[0]}, {x_range[1]}]", fill="black", font=font_text)
+    draw.text((30, 140), f"Derivative Order: {order}", fill="black", font=font_text)
+    draw.text((30, 170), f"Date: {date or np.datetime64('today')}", fill="black", font=font_text)
+
+    left, top, width, height = RECEIPT_GRAPH_BOX
+    if graph.size != (width, height):
+        graph = graph.resize((width, height), Image.LANCZOS)
+    image.paste(graph, (left, top))
+    return image
+
+
+def pdf_page(image, level=6):
+    """An image as a page for PdfReport.add_page: (width, height, deflated RGB bytes).
+
+    The compression is the expensive part, so it can be done in a worker
+    process and only the compressed page sent back.
+    """
+    image = image.convert('RGB')
+    return image.width, image.height, zlib.compress(image.tobytes(), level)
+
+
+class PdfReport:
+    """A multi-page PDF of images, written page by page as they arrive.
+
+    Only the file offsets of the PDF objects are kept in memory, so a report
+    can have any number of pages. Each page is one image at dpi; make pages
+    with pdf_page. Use as a context manager or call close().
+    """
+
+    def __init__(self, path, dpi=100):
+        self.dpi = dpi
+        self.file = open(path, "wb")
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.offsets = [0, 0, 0]  # object 0 is the free list head; 1 and 2 (catalog, page tree) come last
+        self.page_ids = []
+
+    def _object(self, body, stream=None):
+        number = len(self.offsets)
+        self.offsets.append(None)
+        self._write(number, body, stream)
+        return number
+
+    def _write(self, number, body, stream=None):
+        self.offsets[number] = self.file.tell()
+        self.file.write(f"{number} 0 obj\n{body}\n".encode())
+        if stream is not None:
+            self.file.write(b"stream\n" + stream + b"\nendstream\n")
+        self.file.write(b"endobj\n")
+
+    def add_page(self, page):
+        width, height, data = page
+        points = (width * 72 / self.dpi, height * 72 / self.dpi)
+        image = self._object(f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                             f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode "
+                             f"/Length {len(data)} >>", data)
+        content = f"q {points[0]:.2f} 0 0 {points[1]:.2f} 0 0 cm /Im0 Do Q".encode()
+        content = self._object(f"<< /Length {len(content)} >>", content)
+        self.page_ids.append(self._object(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {points[0]:.2f} {points[1]:.2f}] "
+            f"/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {content} 0 R >>"))
+
+    def close(self):
+        if self.file.closed:
+            return
+        self._write(1, "<< /Type /Catalog /Pages 2 0 R >>")
+        kids = " ".join(f"{number} 0 R" for number in self.page_ids)
+        self._write(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>")
+        xref = self.file.tell()
+        self.file.write(f"xref\n0 {len(self.offsets)}\n0000000000 65535 f \n".encode())
+        self.file.writelines(f"{offset:010d} 00000 n \n".encode() for offset in self.offsets[1:])
+        self.file.write(f"trailer\n<< /Size {len(self.offsets)} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,171 @@
+import numpy as np
+
+# Sampling helpers for the DerivaPlot apps
+
+INITIAL_POINTS = 129
+MAX_POINTS = 20000
+# Allowed deviation from a straight segment, as a fraction of the plot height
+SCREEN_TOLERANCE = 1e-3
+MAX_ROUNDS = 16
+
+
+def _as_curves(values, size):
+    """Stack whatever the sampled function returned into a (curves, points) array.
+
+    2-D entries (a stack of curves) contribute one curve per row.
+    """
+    if not isinstance(values, (tuple, list)):
+        values = [values]
+    curves = [np.atleast_2d(np.broadcast_to(np.asarray(v, dtype=float), np.shape(v)[:-1] + (size,)))
+              for v in values if v is not None]
+    return np.vstack(curves)
+
+
+def _screen_scale(curves):
+    """Height of each curve on screen, ignoring poles and non-finite samples."""
+    scales = np.ones(curves.shape[0])
+    for i, curve in enumerate(curves):
+        finite = curve[np.isfinite(curve)]
+        if finite.size:
+            low, high = np.percentile(finite, [1, 99])
+            scales[i] = (high - low) or max(abs(high), 1.0)
+    return scales
+
+
+def adaptive_samples(f, x_min, x_max, initial=INITIAL_POINTS, max_points=MAX_POINTS,
+                     tolerance=SCREEN_TOLERANCE, max_rounds=MAX_ROUNDS):
+    """Sample [x_min, x_max] coarsely, then refine wherever the curve bends on screen.
+
+    f may return one array or a tuple of arrays (None entries are skipped); a
+    point is refined when any curve deviates from the straight line through its
+    neighbours by more than tolerance (in plot heights), or when the curve
+    crosses into or out of its domain. Never returns more than max_points.
+    """
+    initial = max(3, min(initial, max_points))
+    span = x_max - x_min
+
+    # Jitter the coarse grid a little so periodic functions cannot alias onto it
+    cells = np.linspace(x_min, x_max, initial)
+    jitter = np.random.default_rng(0).uniform(-0.25, 0.25, initial) * span / (initial - 1)
+    jitter[[0, -1]] = 0.0
+    x_vals = cells + jitter
+    with np.errstate(all="ignore"):
+        curves = _as_curves(f(x_vals), x_vals.size)
+
+    min_width = span * 1e-9
+    for _ in range(max_rounds):
+        room = max_points - x_vals.size
+        if room <= 0:
+            break
+
+        scales = _screen_scale(curves)[:, None]
+        x0, x1, x2 = x_vals[:-2], x_vals[1:-1], x_vals[2:]
+        y0, y1, y2 = curves[:, :-2], curves[:, 1:-1], curves[:, 2:]
+        with np.errstate(all="ignore"):
+            line = y0 + (y2 - y0) * ((x1 - x0) / (x2 - x0))
+            deviation = np.abs(y1 - line) / scales
+        finite = np.isfinite(curves)
+        bends = np.any(deviation > tolerance, axis=0)
+        domain_edge = np.any(finite[:, :-2] != finite[:, 2:], axis=0)
+
+        # A bending point refines both of its neighbouring intervals
+        refine = np.zeros(x_vals.size - 1, dtype=bool)
+        flagged = bends | domain_edge
+        refine[:-1] |= flagged
+        refine[1:] |= flagged
+        refine &= np.diff(x_vals) > min_width
+        if not refine.any():
+            break
+
+        candidates = np.flatnonzero(refine)
+        if candidates.size > room:
+            # Spend the remaining budget on the worst intervals first
+            worst = np.zeros(x_vals.size - 1)
+            score = np.nan_to_num(np.max(deviation, axis=0), nan=np.inf, posinf=np.inf)
+            worst[:-1] = score
+            worst[1:] = np.maximum(worst[1:], score)
+            candidates = candidates[np.argsort(-worst[candidates], kind="stable")[:room]]
+            candidates.sort()
+
+        new_x = 0.5 * (x_vals[candidates] + x_vals[candidates + 1])
+        with np.errstate(all="ignore"):
+            new_curves = _as_curves(f(new_x), new_x.size)
+        positions = candidates + 1
+        x_vals = np.insert(x_vals, positions, new_x)
+        curves = np.insert(curves, positions, new_curves, axis=1)
+
+    return x_vals
+
+
+def minmax_decimate(x_vals, curves, columns, x_min=None, x_max=None):
+    """Reduce sorted samples to a min and a max per pixel column, so spikes stay visible.
+
+    curves is a (curves, points) array sharing x_vals. Only the part between
+    x_min and x_max (the visible window) is looked at, and the result has at
+    most 3 points per column whatever the input size. A column with
+    non-finite samples (a gap, e.g. a pole) keeps its two sides apart: the
+    most extreme sample before the gap, a NaN, then the most extreme sample
+    after it, so no line is drawn across the gap.
+    """
+    curves = np.atleast_2d(curves)
+    x_min = x_vals[0] if x_min is None else x_min
+    x_max = x_vals[-1] if x_max is None else x_max
+
+    # One extra sample on each side keeps lines running off the edges
+    lo = max(np.searchsorted(x_vals, x_min, side="left") - 1, 0)
+    hi = min(np.searchsorted(x_vals, x_max, side="right") + 1, x_vals.size)
+    x_vals, curves = x_vals[lo:hi], curves[:, lo:hi]
+    if x_vals.size <= 3 * columns:
+        return x_vals, curves
+
+    edges = np.linspace(x_vals[0], x_vals[-1], columns + 1)
+    starts = np.unique(np.searchsorted(x_vals, edges[:-1], side="left"))
+    starts = starts[starts < x_vals.size]
+    ends = np.append(starts[1:], x_vals.size) - 1
+
+    low = np.fmin.reduceat(curves, starts, axis=1)
+    high = np.fmax.reduceat(curves, starts, axis=1)
+
+    gap = np.logical_or.reduceat(~np.isfinite(curves), starts, axis=1)
+    left, right = np.full_like(low, np.nan), np.full_like(low, np.nan)
+    # Only columns holding both a gap and finite samples need splitting (few: the edges of gaps)
+    for row, column in zip(*np.nonzero(gap & np.isfinite(low))):
+        values = curves[row, starts[column]:ends[column] + 1]
+        missing = np.flatnonzero(~np.isfinite(values))
+        left[row, column] = _extreme(values[:missing[0]])
+        right[row, column] = _extreme(values[missing[-1] + 1:])
+
+    x_out = np.column_stack([x_vals[starts], x_vals[ends], x_vals[ends]]).ravel()
+    y_out = np.stack([np.where(gap, left, low), np.where(gap, np.nan, high), np.where(gap, right, high)],
+                     axis=2).reshape(curves.shape[0], -1)
+    return x_out, y_out
+
+
+def _extreme(values):
+    # The sample furthest from zero, or NaN when there is none
+    return values[np.argmax(np.abs(values))] if values.size else np.nan
+
+
+def even_picks(x_vals, columns=1000):
+    """Indices of about columns samples evenly spread over x, however the grid is spaced."""
+    picks = np.searchsorted(x_vals, np.linspace(x_vals[0], x_vals[-1], columns))
+    return np.minimum(picks, x_vals.size - 1)
+
+
+def robust_limits(x_vals, curves, margin=0.1, columns=1000):
+    """y-limits for the bulk of the curves, or None when autoscaling is already fine.
+
+    Samples right next to a pole can be orders of magnitude larger than the
+    rest of the curve; those are left off screen instead of flattening it.
+    """
+    # Look at evenly spaced samples, since adaptive grids crowd around poles
+    picked = np.atleast_2d(curves)[:, even_picks(x_vals, columns)]
+    finite = picked[np.isfinite(picked)]
+    if finite.size < 10:
+        return None
+    low, high = np.percentile(finite, [2, 98])
+    extent = high - low or max(abs(high), 1.0)
+    everything = np.asarray(curves)[np.isfinite(curves)]
+    if everything.max() - everything.min() <= 10 * extent:
+        return None
+    return low - margin * extent, high + margin * extent
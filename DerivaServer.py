@@ -0,0 +1,353 @@
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import sympy as sp
+
+from DerivaBatch import compute_job, write_npz
+from DerivaEngine import expression_parameters, parse_expression, split_expressions
+from DerivaGuard import guard_expression
+from DerivaRender import RECEIPT_GRAPH_BOX, figure_image, plot_figure, receipt_image
+
+# Local HTTP service: curves, plots and receipts computed by the DerivaPlot engine
+
+MAX_SAMPLES = 1000000
+MAX_DPI = 600
+MAX_PENDING = 64
+CACHE_BYTES = 256 * 2**20
+# Longest a request waits for its result before giving up with 504
+REQUEST_TIMEOUT = 120.0
+
+NUMERIC_CHOICES = ("fast", "balanced", "accurate")
+ENGINE_CHOICES = ("symbolic", "chebyshev", "autodiff")
+# Endpoint -> kind of result
+ENDPOINTS = {"/curves": "curves", "/plot.png": "png", "/plot.svg": "svg", "/receipt.png": "receipt"}
+CONTENT_TYPES = {"json": "application/json", "npz": "application/octet-stream", "png": "image/png",
+                 "svg": "image/svg+xml", "receipt": "image/png"}
+# Formats /curves can return (the others belong to the image endpoints)
+CURVE_FORMATS = ("json", "npz")
+# Request fields; parameter values have their own namespace (p.a=2, or "params": {"a": 2} in JSON)
+OPTION_FIELDS = ("expr", "x_min", "x_max", "order", "samples", "numeric", "engine", "format", "dpi")
+PARAMETER_PREFIX = "p."
+
+
+class Busy(Exception):
+    """Every worker slot is taken; the client should retry later."""
+
+
+@lru_cache(maxsize=1024)
+def canonical_expression(text):
+    """Canonical form of one expression: its SymPy srepr, display text and parameter names."""
+    guard_expression(text)
+    sympy_expr = parse_expression(text)
+    return sp.srepr(sympy_expr), str(sympy_expr), tuple(symbol.name for symbol in expression_parameters(sympy_expr))
+
+
+def parse_request(kind, fields):
+    """Turn query or JSON fields into (job, options, key); raises ValueError for bad input.
+
+    Parameter values come from PARAMETER_PREFIX fields, so a parameter may
+    share its name with an option. The key hashes the canonical expressions,
+    range, order, sample count, parameter values and options, so equivalent
+    spellings share one cache entry. Outputs are labelled with the canonical
+    text for the same reason.
+    """
+    unknown = [field for field in fields if field not in OPTION_FIELDS and not field.startswith(PARAMETER_PREFIX)]
+    if unknown:
+        raise ValueError(f"Unknown field {unknown[0]!r} (parameter values go in {PARAMETER_PREFIX}{unknown[0]})")
+    texts = split_expressions(fields.get("expr", ""))
+    if not texts:
+        raise ValueError("Function expression cannot be empty")
+    canonical = [canonical_expression(text) for text in texts]
+    names = sorted({name for _, _, parameters in canonical for name in parameters})
+
+    x_min, x_max = float(fields.get("x_min", -10)), float(fields.get("x_max", 10))
+    order = int(fields.get("order", 1))
+    samples = int(float(fields["samples"])) if fields.get("samples") not in (None, "") else None
+    if not x_min < x_max:
+        raise ValueError("Min x must be less than Max x")
+    if order < 1:
+        raise ValueError("Derivative order must be at least 1")
+    if samples is not None and not 2 <= samples <= MAX_SAMPLES:
+        raise ValueError(f"Samples must be between 2 and {MAX_SAMPLES:,}")
+
+    options = {
+        "numeric": str(fields.get("numeric", "balanced")).lower(),
+        "engine": str(fields.get("engine", "symbolic")).lower(),
+        "format": str(fields.get("format", "json")).lower() if kind == "curves" else kind,
+    }
+    if options["numeric"] not in NUMERIC_CHOICES:
+        raise ValueError(f"numeric must be one of {', '.join(NUMERIC_CHOICES)}")
+    if options["engine"] not in ENGINE_CHOICES:
+        raise ValueError(f"engine must be one of {', '.join(ENGINE_CHOICES)}")
+    if kind == "curves" and options["format"] not in CURVE_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(CURVE_FORMATS)}")
+    if kind != "curves":
+        options["dpi"] = min(max(int(fields.get("dpi", 150)), 10), MAX_DPI)
+    if kind == "receipt":
+        # The receipt is dated
+        options["date"] = str(np.datetime64('today'))
+
+    values = {field[len(PARAMETER_PREFIX):]: value for field, value in fields.items()
+              if field.startswith(PARAMETER_PREFIX)}
+    extra = sorted(set(values) - set(names))
+    if extra:
+        raise ValueError(f"The functions have no parameter {extra[0]!r}")
+    parameters = {name: float(values.get(name, 1.0)) for name in names}
+    job = {"index": 0, "name": "request", "expression": "; ".join(display for _, display, _ in canonical),
+           "x_min": x_min, "x_max": x_max, "order": order, "samples": samples, "parameters": parameters}
+
+    identity = {"expressions": [srepr for srepr, _, _ in canonical], "x_range": [x_min, x_max], "order": order,
+                "samples": samples, "parameters": parameters, **options}
+    key = hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+    return job, options, key
+
+
+def _json_array(values):
+    # JSON has no NaN/inf; gaps and poles become null
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+def render(job, options):
+    """Compute one request and encode it (runs in a worker process).
+
+    parse_request has guarded the expressions in the server process already.
+    """
+    result = compute_job(job, options["numeric"], options["engine"], checked=True)
+    fmt = options["format"]
+    buffer = io.BytesIO()
+    if fmt == "json":
+        buffer.write(json.dumps({
+            "expressions": result["expressions"],
+            "parameters": result["parameters"],
+            "order": job["order"],
+            "x": _json_array(result["x"]),
+            "y": _json_array(result["y"]),
+            "derivative": _json_array(result["derivative"]),
+            "integral": _json_array(result["integral"]),
+            "integral_error": _json_array(result["integral_error"]),
+        }).encode())
+    elif fmt == "npz":
+        write_npz(buffer, job, result)
+    else:
+        curves = np.vstack([result["y"], result["derivative"], result["integral"]])
+        fig = plot_figure(result["x"], curves, result["expressions"], job["order"], dpi=options["dpi"])
+        if fmt == "receipt":
+            graph = figure_image(fig, size=RECEIPT_GRAPH_BOX[2:])
+            receipt_image(graph, job["expression"], (job["x_min"], job["x_max"]),
+                          job["order"], options["date"]).save(buffer, "PNG")
+        else:
+            fig.savefig(buffer, format=fmt, dpi=options["dpi"])
+    return buffer.getvalue()
+
+
+class ResultCache:
+    """LRU cache of encoded responses, keyed on their content hash and bounded in bytes."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, dropped = self._entries.popitem(last=False)
+                self.size -= len(dropped)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RenderService:
+    """Bounded process pool behind the cache; identical requests in flight share one computation."""
+
+    def __init__(self, workers=None, max_pending=MAX_PENDING, cache_bytes=CACHE_BYTES):
+        # spawn keeps the workers independent of the server's threads
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self.max_pending = max_pending
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.cache = ResultCache(cache_bytes)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+
+    def result(self, key, job, options):
+        """The encoded response for a parsed request and whether it came from the cache."""
+        body = self.cache.get(key)
+        if body is not None:
+            return body, "hit"
+
+        with self._lock:
+            future = self._inflight.get(key)
+            shared = future is not None
+            if future is None:
+                if not self.slots.acquire(blocking=False):
+                    raise Busy()
+                future = self.executor.submit(render, job, options)
+                self._inflight[key] = future
+                future.add_done_callback(lambda done: self._finished(key, done))
+        return future.result(REQUEST_TIMEOUT), "shared" if shared else "miss"
+
+    def _finished(self, key, future):
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key, future.result())
+        with self._lock:
+            self._inflight.pop(key, None)
+        self.slots.release()
+
+    def stats(self):
+        return {"workers": self.workers, "pending": len(self._inflight), "max_pending": self.max_pending,
+                "cache_entries": len(self.cache), "cache_bytes": self.cache.size,
+                "cache_hits": self.cache.hits, "cache_misses": self.cache.misses}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """GET with query parameters or POST with a JSON object, e.g. /plot.png?expr=a*sin(x)&x_min=-3&x_max=3&p.a=2
+
+    A JSON body gives parameter values as an object: {"expr": "a*sin(x)", "params": {"a": 2}}.
+    """
+
+    protocol_version = "HTTP/1.1"
+    service = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.respond(url.path, dict(parse_qsl(url.query)))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            fields = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(fields, dict):
+                raise ValueError("Expected a JSON object")
+            params = fields.pop("params", {})
+            if not isinstance(params, dict):
+                raise ValueError("params must be an object of parameter values")
+        except ValueError as e:
+            self.send_json(400, {"error": f"Invalid request body: {e}"})
+            return
+        fields = {key: str(value) for key, value in fields.items()}
+        fields.update((PARAMETER_PREFIX + name, str(value)) for name, value in params.items())
+        self.respond(url.path, fields)
+
+    def respond(self, path, fields):
+        if path == "/stats":
+            self.send_json(200, self.service.stats())
+            return
+        kind = ENDPOINTS.get(path)
+        if kind is None:
+            self.send_json(404, {"error": f"Unknown endpoint {path}", "endpoints": sorted(ENDPOINTS)})
+            return
+
+        try:
+            job, options, key = parse_request(kind, fields)
+            etag = f'"{key}"'
+            # Content-addressed: a client holding the tag already has these bytes
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body, cache = self.service.result(key, job, options)
+        except Busy:
+            self.send_json(503, {"error": "Server busy, try again"}, {"Retry-After": "1"})
+            return
+        except FutureTimeout:
+            self.send_json(504, {"error": "Calculation took too long"})
+            return
+        except ValueError as e:
+            self.send_json(400, {"error": f"Invalid input: {e}"})
+            return
+        except Exception as e:
+            self.send_json(500, {"error": f"Error calculating results: {e}"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[options["format"]])
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "max-age=86400" if options["format"] != "receipt" else "no-cache")
+        self.send_header("X-Cache", cache)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host="127.0.0.1", port=8765, workers=None, max_pending=MAX_PENDING, cache_bytes=CACHE_BYTES):
+    """Run the service until interrupted."""
+    service = RenderService(workers, max_pending, cache_bytes)
+    handler = type("Handler", (RequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    print(f"DerivaPlot service on http://{host}:{server.server_port} "
+          f"({service.workers} workers, endpoints: {', '.join(sorted(ENDPOINTS))}, /stats)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve DerivaPlot curves, plots and receipts over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8765, help="port (default: %(default)s)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--queue", type=int, default=MAX_PENDING,
+                        help="computations allowed in flight before answering 503 (default: %(default)s)")
+    parser.add_argument("--cache-mb", type=int, default=CACHE_BYTES // 2**20,
+                        help="result cache size in MB (default: %(default)s)")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.queue, args.cache_mb * 2**20)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -1,11 +1,14 @@
-import numpy as np
 import matplotlib.pyplot as plt
 import sympy as sp
-from scipy.misc import derivative
-from scipy.integrate import quad
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
+import multiprocessing
 from PIL import Image, ImageDraw, ImageFont
+from DerivaEngine import cumulative_integral
+from DerivaGuard import guard_expression
+from DerivaNumeric import numeric_derivative as vectorized_derivative
+from DerivaRender import figure_image
+from DerivaSampling import adaptive_samples
 
 # Set customtkinter appearance
 ctk.set_appearance_mode("dark")
@@ -13,20 +16,21 @@ ctk.set_default_color_theme("blue")
 
 def numerical_derivative(f, x_vals, order=1):
     """Compute the numerical derivative of a function."""
-    return np.array([derivative(f, x, dx=1e-5, n=order) for x in x_vals])
+    # Whole array at once (scipy.misc.derivative is gone from current SciPy)
+    return vectorized_derivative(f, x_vals, order)
 
 def numerical_integral(f, x_vals):
     """Compute the numerical integral of a function."""
-    return np.array([quad(f, 0, x)[0] for x in x_vals])
+    return cumulative_integral(f, x_vals, lower=0)[0]
 
 def plot_functions(f, f_expr, x_range, derivative_order):
     """Plot the function, its derivative, and its integral."""
-    x_vals = np.linspace(x_range[0], x_range[1], 400)
+    x_vals = adaptive_samples(f, x_range[0], x_range[1])
     y_vals = f(x_vals)
     dydx_vals = numerical_derivative(f, x_vals, derivative_order)
     integral_vals = numerical_integral(f, x_vals)
     
-    plt.figure(figsize=(10, 6))
+    fig = plt.figure(figsize=(10, 6))
     plt.plot(x_vals, y_vals, label=f'Function: {f_expr}')
     plt.plot(x_vals, dydx_vals, label=f'{derivative_order}-Order Derivative', linestyle='dashed')
     plt.plot(x_vals, integral_vals, label='Integral', linestyle='dotted')
@@ -37,13 +41,10 @@ def plot_functions(f, f_expr, x_range, derivative_order):
     plt.grid()
     plt.title('Function, Derivative, and Integral')
     
-    # Save the graph temporarily
-    graph_path = "temp_graph.png"
-    plt.savefig(graph_path)
     plt.show()
-    return graph_path
+    return fig
 
-def save_receipt(f_expr, x_range, derivative_order, graph_path):
+def save_receipt(f_expr, x_range, derivative_order, fig):
     """Save a receipt with function details and the graph."""
     receipt_path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG files", "*.png")])
     if not receipt_path:
@@ -60,9 +61,8 @@ def save_receipt(f_expr, x_range, derivative_order, graph_path):
     draw.text((20, 100), f"X Range: {x_range}", fill="black", font=font)
     draw.text((20, 140), f"Derivative Order: {derivative_order}", fill="black", font=font)
     
-    # Add graph to receipt
-    graph_img = Image.open(graph_path)
-    graph_img = graph_img.resize((450, 300))
+    # Add graph to receipt, drawn in memory at its final size
+    graph_img = figure_image(fig, size=(450, 300))
     image.paste(graph_img, (25, 180))
     
     # Save receipt
@@ -73,6 +73,8 @@ def validate_inputs(expr, x_min, x_max, order):
     """Validate user inputs and properly convert functions."""
     try:
         x = sp.symbols('x')
+        # Refuse input SymPy would choke on (e.g. 9**9**9) before parsing it here
+        guard_expression(expr)
         # Convert the expression into a sympy function
         sympy_expr = sp.sympify(expr, locals={"sin": sp.sin, "cos": sp.cos, "tan": sp.tan, "exp": sp.exp, "log": sp.log, "sqrt": sp.sqrt})
         # Convert to a lambda function that NumPy can evaluate
@@ -107,11 +109,11 @@ def main():
         if not is_valid:
             return
         
-        # Plot functions and save graph
-        graph_path = plot_functions(f, expr, (float(x_min), float(x_max)), int(order))
+        # Plot functions
+        fig = plot_functions(f, expr, (float(x_min), float(x_max)), int(order))
         
         # Save receipt
-        save_receipt(expr, (x_min, x_max), order, graph_path)
+        save_receipt(expr, (x_min, x_max), order, fig)
     
     # UI Elements
     label_func = ctk.CTkLabel(root, text="Enter function (e.g., x**2 + 3*x + 5):")
@@ -140,6 +142,8 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Lets frozen builds start the expression guard's worker process
+    multiprocessing.freeze_support()
     main()
 
 
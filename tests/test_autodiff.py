@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+import sympy as sp
+from scipy import special
+
+from DerivaAutodiff import taylor_derivative, taylor_derivatives
+from DerivaEngine import fallback_derivative, lambdify_expression, parse_expression, x
+
+TEXTS = ["exp(-x**2)*sin(5*x)/(1 + x**2)", "log(2 + cos(x))*sqrt(1 + x**2)", "tanh(x)**3 - atan(2*x)"]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_derivatives_up_to_order_8_match_sympy(text):
+    expr = parse_expression(text)
+    x_vals = np.linspace(-2.0, 2.0, 81)
+    derivatives = taylor_derivatives(sp.lambdify(x, expr, "numpy"), x_vals, 8)
+    assert derivatives.shape == (9, x_vals.size)
+    for order in range(9):
+        expected = lambdify_expression(sp.diff(expr, x, order))(x_vals)
+        assert np.allclose(derivatives[order], expected, rtol=1e-9, atol=1e-9 * np.abs(expected).max())
+
+
+def test_constant_function():
+    assert np.all(taylor_derivative(lambda x_vals: 3.0, np.linspace(0, 1, 5), 2) == 0.0)
+
+
+def test_missing_rule_raises_and_falls_back():
+    with pytest.raises(NotImplementedError, match="gamma"):
+        taylor_derivative(special.gamma, np.linspace(1, 3, 5))
+    # The engine then takes the numeric preset instead
+    x_vals = np.linspace(1, 3, 5)
+    expected = special.gamma(x_vals) * special.digamma(x_vals)
+    assert np.allclose(fallback_derivative(special.gamma, x_vals), expected, rtol=1e-6)
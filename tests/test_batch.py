@@ -0,0 +1,21 @@
+from DerivaBatch import check_jobs, load_jobs
+
+
+def test_bad_rows_are_reported_and_the_rest_still_load(tmp_path):
+    jobs_file = tmp_path / "jobs.csv"
+    jobs_file.write_text(
+        "name,expression,x_min,x_max,order\n"
+        "good,sin(x),0,1,1\n"
+        "empty,,0,1,1\n"
+        "backwards,x**2,2,1,1\n"
+        "order,x**2,0,1,0\n"
+        "number,x**2,zero,1,1\n"
+        "also-good,cos(x),-1,1,2\n"
+    )
+    jobs = load_jobs(jobs_file)
+    assert [job["name"] for job in jobs] == ["good", "empty", "backwards", "order", "number", "also-good"]
+
+    passed, failed = check_jobs(jobs)
+    assert [job["name"] for job in passed] == ["good", "also-good"]
+    assert [report["name"] for report in failed] == ["empty", "backwards", "order", "number"]
+    assert all(report["error"].startswith("ValueError: Row ") for report in failed)
@@ -0,0 +1,48 @@
+import numpy as np
+import sympy as sp
+
+from DerivaChebyshev import ChebyshevSeries
+from DerivaEngine import (compile_expression, cumulative_integral, evaluate_segments, lambdify_expression,
+                          parse_expression, x)
+
+TEXT = "exp(sin(x)) / (2 + cos(3*x))"
+
+
+def closed_form(text, order=0):
+    expr = parse_expression(text)
+    return lambdify_expression(sp.diff(expr, x, order) if order else expr)
+
+
+def test_derivative_and_integral_of_a_smooth_function():
+    f = closed_form(TEXT)
+    series = ChebyshevSeries.fit(f, -2.0, 3.0)
+    assert series is not None
+    x_vals = np.linspace(-2.0, 3.0, 401)
+    assert np.allclose(series(x_vals), f(x_vals), rtol=0, atol=1e-13)
+    # Each derivative loses about n**2 in accuracy at the ends of the range
+    for order, tolerance in ((1, 1e-9), (2, 1e-7)):
+        expected = closed_form(TEXT, order)(x_vals)
+        error = np.abs(series.derivative(order)(x_vals) - expected)
+        assert error.max() <= tolerance * np.abs(expected).max()
+
+    integral = series.integral()(x_vals)
+    expected = cumulative_integral(f, x_vals, epsabs=1e-13, epsrel=1e-13)[0]
+    assert np.allclose(integral, expected, rtol=0, atol=1e-12)
+
+
+def test_no_series_where_f_is_not_smooth():
+    assert ChebyshevSeries.fit(np.tan, -3.0, 3.0) is None
+    assert ChebyshevSeries.fit(np.abs, -1.0, 1.0) is None
+
+
+def test_engine_matches_symbolic_and_falls_back_at_breaks():
+    # The smooth function goes through the series, the other two are split and done symbolically
+    for text, smooth in ((TEXT, True), ("tan(x)", False), ("sign(x) + x**2", False)):
+        compiled = compile_expression(text)
+        x_vals = np.linspace(-2.0, 3.0, 501)
+        assert (compiled.chebyshev(-2.0, 3.0) is not None) == smooth
+        spectral = evaluate_segments(compiled, x_vals, engine="chebyshev")
+        symbolic = evaluate_segments(compiled, x_vals)
+        for a, b in zip(spectral[:4], symbolic[:4]):
+            assert a.shape == b.shape
+            assert np.allclose(a, b, rtol=1e-8, atol=1e-8, equal_nan=True)
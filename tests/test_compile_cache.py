@@ -0,0 +1,19 @@
+from DerivaEngine import CompileCache
+
+
+def test_spellings_of_one_expression_share_an_entry():
+    cache = CompileCache()
+    first = cache.get("x + sin(x)")
+    assert cache.get("sin(x)+x") is first
+    assert cache.get("  x +  sin(x) ") is first
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = CompileCache(maxsize=2)
+    square, cube = cache.get("x**2"), cache.get("x**3")
+    assert cache.get("x**2") is square  # now the most recently used
+    cache.get("x**4")
+    assert cache.get("x**2") is square
+    assert cache.get("x**3") is not cube
+    assert cache.misses == 4
@@ -0,0 +1,74 @@
+import time
+
+import numpy as np
+import pytest
+
+from DerivaEngine import batch_rows, compile_batch, compile_expression, evaluate_segments, sample_grid
+
+
+def rows(text, x_vals, **kwargs):
+    return batch_rows(compile_batch([text]).bind({}), np.asarray(x_vals, dtype=float), **kwargs)[0]
+
+
+def test_window_integral_anchored_at_lower():
+    _, _, integral_vals, _, _ = rows("sin(x)", np.linspace(0, 1, 11), lower=-3)
+    assert np.isclose(integral_vals[-1], np.cos(-3) - np.cos(1))
+
+
+def test_window_integral_restarts_after_pole_outside_window():
+    # tan has a pole at -pi/2, between lower and the window; the integral must not be carried across it
+    _, _, integral_vals, _, _ = rows("tan(x)", np.linspace(0, 1, 101), lower=-3)
+    assert integral_vals[0] == 0.0
+    assert np.isclose(integral_vals[-1], -np.log(np.cos(1)))
+
+
+def test_poles_sympy_misses_are_found():
+    poles = np.array([-2.6179939, -1.7398894, -0.5235988, 2.8968360])
+    x_vals = np.linspace(-3, 3, 2001)
+    _, _, integral_vals, _, breaks = rows("1/(sin(x) + cos(3*x) + 0.5)", x_vals)
+    broken = x_vals[:-1][breaks]
+    assert broken.size == poles.size
+    assert np.all(np.abs(broken - poles) < 0.01)
+
+
+def test_sign_change_poles_without_symbolic_help():
+    # gamma's poles at 0, -1 and -2 are not found by the symbolic search (the grid steps over them)
+    x_vals = np.linspace(-2.5, 2.5, 1000)
+    _, _, _, _, breaks = rows("gamma(x)", x_vals)
+    assert np.allclose(np.sort(np.round(x_vals[:-1][breaks])), [-2, -1, 0])
+
+
+def test_zero_crossings_are_not_breaks():
+    _, _, _, _, breaks = rows("sin(5*x) * x", np.linspace(-3, 3, 301))
+    assert not breaks.any()
+
+
+@pytest.mark.parametrize("text, pole", [("1/(x - 1)**2", 1.0), ("1/abs(x)", 0.0), ("tan(x)", np.pi / 2)])
+def test_poles_split_on_adaptive_grid(text, pole):
+    # sample_grid crowds samples around the pole, which must not hide it
+    compiled = compile_expression(text)
+    x_vals, y_vals, _, integral_vals, _ = evaluate_segments(compiled, sample_grid(compiled, -3, 3))
+    gaps = x_vals[np.isnan(y_vals)]
+    assert np.any(np.abs(gaps - pole) < 1e-3)
+    # The integral restarts after the pole instead of running across it
+    after = (x_vals > pole) & np.isfinite(integral_vals)
+    assert np.isclose(integral_vals[after][0], 0.0)
+
+
+def test_pole_without_symbolic_form_on_adaptive_grid():
+    # Nothing finds zeta's pole at 1 symbolically, and the grid puts a sample within 1e-10 of it
+    compiled = compile_expression("zeta(x)")
+    x_vals, y_vals, _, _, _ = evaluate_segments(compiled, sample_grid(compiled, -3, 3))
+    gaps = x_vals[np.isnan(y_vals)]
+    assert gaps.size == 1 and abs(gaps[0] - 1.0) < 1e-3
+    assert np.nanmax(np.abs(y_vals)) < 1e12
+
+
+def test_slow_differentiation_is_cut_off(monkeypatch):
+    import DerivaEngine
+    monkeypatch.setattr(DerivaEngine, "DIFF_TIME_BUDGET", 0.2)
+    compile_expression("x")  # starts the guard, which enforces the budget
+    expr = DerivaEngine.parse_expression("exp(sin(exp(cos(x**3)/(1 + x**2))))*tan(sqrt(1 + x**4))")
+    start = time.perf_counter()
+    assert DerivaEngine.derivative_expression(expr, 12) is None
+    assert time.perf_counter() - start < 5
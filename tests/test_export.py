@@ -0,0 +1,33 @@
+import numpy as np
+
+from DerivaEngine import batch_rows, compile_batch
+from DerivaExport import engine_chunks
+
+
+def test_engine_chunks_match_one_pass_across_poles():
+    bound = compile_batch(["tan(x)", "1/(x - 0.5)"]).bind({})
+    samples = 3001
+    pieces = list(engine_chunks(bound, (-3, 3), 1, samples, chunk_rows=257))
+    assert [start for start, _ in pieces] == list(range(0, samples, 257))
+    chunked = np.hstack([block for _, block in pieces])
+
+    x_vals = np.linspace(-3, 3, samples)
+    whole = np.vstack([x_vals] + [curve for row in batch_rows(bound, x_vals) for curve in row[:3]])
+    assert chunked.shape == whole.shape
+    assert np.array_equal(np.isnan(chunked), np.isnan(whole))
+    assert np.allclose(chunked, whole, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_engine_chunks_search_poles_once(monkeypatch):
+    import DerivaEngine
+    calls = []
+    search = DerivaEngine.singular_points
+    monkeypatch.setattr(DerivaEngine, "singular_points", lambda *args: calls.append(args[1:]) or search(*args))
+    bound = compile_batch(["1/(x - 0.2503)**2"]).bind({})
+    pieces = list(engine_chunks(bound, (-2, 2), 1, 2001, chunk_rows=300))
+    assert calls == [(-2, 2)]
+    # One gap: the integral restarts right after the pole, in whichever piece it falls
+    F = np.hstack([block for _, block in pieces])[3]
+    x_vals = np.linspace(-2, 2, 2001)
+    after = np.flatnonzero(x_vals > 0.2503)[0]
+    assert F[after] == 0.0 and np.all(np.isfinite(F))
@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+from DerivaGuard import GuardError, guard_expression, guarded
+
+
+@pytest.mark.parametrize("text", ["isprime(2**9999 - 1)", "x > 1"])
+def test_conditions_are_rejected(text):
+    with pytest.raises(GuardError, match="true/false"):
+        guard_expression(text)
+
+
+def test_huge_exponent_is_rejected_before_sympy():
+    with pytest.raises(GuardError, match="Exponent is too large"):
+        guard_expression("9**9**9")
+
+
+def test_huge_factorial_is_rejected_before_sympy():
+    with pytest.raises(GuardError, match="Argument of factorial"):
+        guard_expression("factorial(10**6)")
+
+
+def test_slow_work_is_stopped_at_the_timeout():
+    start = time.monotonic()
+    with pytest.raises(GuardError, match="longer than 0.5 s"):
+        guarded(time.sleep, 30, timeout=0.5)
+    assert time.monotonic() - start < 10
+    # The stuck worker was replaced
+    assert guarded(abs, -2) == 2
+
+
+def test_ordinary_expressions_pass():
+    guard_expression("a*sin(b*x) + gamma(x)/x")
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+import sympy as sp
+
+from DerivaEngine import lambdify_expression, parse_expression, x
+from DerivaNumeric import NUMERIC_PRESETS, numeric_derivative
+
+CASES = [
+    ("sin(x)*exp(x)", -3, 3),
+    ("gamma(x)", 0.05, 3),
+    ("gamma(x)", -2.9, -2.1),
+    ("erf(x)*sqrt(x)", 0.01, 2),
+    ("loggamma(x)", 0.5, 5),
+]
+
+
+@pytest.mark.parametrize("text, x_min, x_max", CASES)
+@pytest.mark.parametrize("order", [1, 2])
+def test_accurate_matches_symbolic(text, x_min, x_max, order):
+    sympy_expr = parse_expression(text)
+    x_vals = np.linspace(x_min, x_max, 300)
+    exact = lambdify_expression(sp.diff(sympy_expr, x, order))(x_vals)
+    result = numeric_derivative(lambdify_expression(sympy_expr), x_vals, order, **NUMERIC_PRESETS["accurate"])
+    assert np.all(np.isfinite(result))
+    assert np.max(np.abs(result - exact) / np.maximum(np.abs(exact), 1.0)) < 1e-9
@@ -0,0 +1,28 @@
+import numpy as np
+
+from DerivaSampling import minmax_decimate
+
+
+def test_decimate_keeps_extremes():
+    x_vals = np.linspace(0, 1, 10001)
+    curves = np.sin(40 * x_vals)[None]
+    curves[0, 5000] = 50.0
+    x_out, y_out = minmax_decimate(x_vals, curves, 100)
+    assert x_out.size <= 3 * 100 and y_out.shape == (1, x_out.size)
+    assert np.nanmax(y_out) == 50.0 and np.isclose(np.nanmin(y_out), -1, atol=1e-3)
+
+
+def test_decimate_does_not_bridge_gap_inside_column():
+    x_vals = np.linspace(-1, 1, 3001)
+    with np.errstate(divide="ignore"):
+        curves = np.vstack([1 / x_vals, x_vals])
+    curves[0, 1500] = np.nan  # the pole at 0, in the middle of a column
+    x_out, y_out = minmax_decimate(x_vals, curves, 100)
+
+    # No segment of the decimated line crosses from one side of the pole to the other
+    joined = np.isfinite(y_out[0, :-1]) & np.isfinite(y_out[0, 1:])
+    assert not np.any(joined & (np.sign(y_out[0, :-1]) != np.sign(y_out[0, 1:])))
+    # Both sides still reach the samples right next to the pole
+    assert np.nanmax(y_out[0]) == curves[0, 1501] and np.nanmin(y_out[0]) == curves[0, 1499]
+    # A curve without a gap in that column is unaffected
+    assert np.all(np.isfinite(y_out[1]))
@@ -0,0 +1,36 @@
+import pytest
+
+from DerivaServer import parse_request
+
+
+def test_curves_formats():
+    for fmt in ("json", "npz"):
+        _, options, _ = parse_request("curves", {"expr": "sin(x)", "format": fmt})
+        assert options["format"] == fmt
+
+
+@pytest.mark.parametrize("fmt", ["png", "svg", "receipt", "csv"])
+def test_curves_rejects_image_formats(fmt):
+    with pytest.raises(ValueError, match="format"):
+        parse_request("curves", {"expr": "sin(x)", "format": fmt})
+
+
+def test_image_endpoints_get_dpi():
+    _, options, _ = parse_request("png", {"expr": "sin(x)", "dpi": "5000"})
+    assert options["format"] == "png" and options["dpi"] == 600
+
+
+def test_parameters_have_their_own_namespace():
+    job, options, _ = parse_request("png", {"expr": "order*sin(dpi*x)", "order": "2", "dpi": "100",
+                                            "p.order": "3", "p.dpi": "0.5"})
+    assert job["order"] == 2 and options["dpi"] == 100
+    assert job["parameters"] == {"dpi": 0.5, "order": 3.0}
+
+
+@pytest.mark.parametrize("fields, message", [
+    ({"expr": "a*sin(x)", "a": "2"}, "p.a"),
+    ({"expr": "a*sin(x)", "p.b": "2"}, "no parameter 'b'"),
+])
+def test_misplaced_parameters_are_rejected(fields, message):
+    with pytest.raises(ValueError, match=message):
+        parse_request("curves", fields)
@@ -1,14 +1,14 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-import sympy as sp
-from scipy.integrate import quad
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 import os
-from PIL import Image, ImageDraw, ImageFont
-import csv
-import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from DerivaEngine import Cancelled, ComputeJob, compile_expression, evaluate_segments, sample_grid
+from DerivaExport import DELIMITERS, PRECISIONS, write_csv
+from DerivaRender import RECEIPT_GRAPH_BOX, figure_image, receipt_image
 
 class FunctionVisualizerApp:
     def __init__(self, root):
@@ -31,6 +31,12 @@ class FunctionVisualizerApp:
         
         self.graph_path = None
         self.fig = None
+
+        # Exports run on a worker thread; the Tk thread polls for progress
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DerivaExport")
+        self.export_job = None
+        self.poll_delay = 50  # ms between progress updates
+        self.csv_options = {"precision": 17, "delimiter": "Comma", "header": True}
         
         self.create_widgets()
         
@@ -246,8 +252,8 @@ class FunctionVisualizerApp:
     Tips:
 
     For complex functions, use parentheses to ensure proper order of operations
-    The derivative is calculated numerically, so very steep functions might show
-    some approximation errors
+    The derivative is calculated symbolically when possible and numerically
+    otherwise, so very complicated functions might show some approximation errors
     Toggle between light and dark themes using the theme button
     
     **Group Members:**  
@@ -294,13 +300,9 @@ class FunctionVisualizerApp:
             return False, None, None, None
             
         try:
-            x = sp.symbols('x')
-            # Convert the expression into a sympy function
-            sympy_expr = sp.sympify(expr, locals={"sin": sp.sin, "cos": sp.cos, "tan": sp.tan, 
-                                                "exp": sp.exp, "log": sp.log, "sqrt": sp.sqrt,
-                                                "pi": sp.pi, "e": sp.E})
-            # Convert to a lambda function that NumPy can evaluate
-            f = sp.lambdify(x, sympy_expr, 'numpy')
+            # Parse and compile once; expressions seen before come from the compile cache
+            compiled = compile_expression(expr)
+            f = compiled.function
             
             # Ensure numerical validity
             x_min_val = float(x_min)
@@ -320,27 +322,22 @@ class FunctionVisualizerApp:
             except Exception:
                 raise ValueError("Function cannot be evaluated. Check your syntax.")
             
+            # Kept for the symbolic derivative and exports
+            self.compiled = compiled
             return True, f, (x_min_val, x_max_val), order_val
         except Exception as e:
             messagebox.showerror("Input Error", f"Invalid input: {e}")
             return False, None, None, None
             
-    def numerical_derivative(self, f, x_vals, order=1):
-        """Compute the numerical derivative of a function."""
-        if order == 1:
-            dx = x_vals[1] - x_vals[0]
-            return np.gradient(f(x_vals), dx)
-        else:
-            # Simple implementation for higher order derivatives
-            result = f(x_vals)
-            for _ in range(order):
-                dx = x_vals[1] - x_vals[0]
-                result = np.gradient(result, dx)
-            return result
+    def compute_curves(self, compiled, x_vals, order=1):
+        """Compute the function, its derivative and its integral in one fused pass.
 
-    def numerical_integral(self, f, x_vals):
-        """Compute the numerical integral of a function."""
-        return np.array([quad(f, x_vals[0], x)[0] for x in x_vals])
+        Returns x_vals with a gap sample added at every pole or jump, so the
+        curves are not joined (or integrated) across it.
+        """
+        # Symbolic derivative/antiderivative when they exist, numeric fallbacks otherwise
+        x_vals, y_vals, dydx_vals, integral_vals, self.integral_error = evaluate_segments(compiled, x_vals, order)
+        return x_vals, y_vals, dydx_vals, integral_vals
         
     def on_plot(self):
         """Handle the plot button click."""
@@ -367,12 +364,11 @@ class FunctionVisualizerApp:
             self.root.update()
             
             # Create plot
-            x_vals = np.linspace(x_range[0], x_range[1], 400)
+            # Coarse grid refined wherever the curves bend
+            x_vals = sample_grid(self.compiled, x_range[0], x_range[1], order_val)
             
             try:
-                y_vals = f(x_vals)
-                dydx_vals = self.numerical_derivative(f, x_vals, order_val)
-                integral_vals = self.numerical_integral(f, x_vals)
+                x_vals, y_vals, dydx_vals, integral_vals = self.compute_curves(self.compiled, x_vals, order_val)
                 
                 # Create figure
                 plt.style.use('default')  # Reset style
@@ -425,17 +421,19 @@ class FunctionVisualizerApp:
                 self.btn_receipt.configure(state="normal")
                 self.btn_csv.configure(state="normal")
                 
-                # Store data for receipt
+                # Store data for receipt and export
                 self.current_data = {
                     "expr": self.entry_func.get(),
                     "x_range": x_range,
-                    "order": order_val
+                    "order": order_val,
+                    "x_vals": x_vals,
+                    "curves": (y_vals, dydx_vals, integral_vals)
                 }
 
                 # Change the plot button to reset
                 self.btn_plot.configure(text="Reset Plot", command=self.on_reset_plot)
                 
-                self.status_var.set("Plot completed successfully")
+                self.status_var.set(f"Plot completed successfully (integral error ≤ {np.nanmax(self.integral_error):.1e})")
             except Exception as e:
                 messagebox.showerror("Calculation Error", f"Error calculating results: {e}")
                 self.status_var.set("Error in calculation")
@@ -446,6 +444,7 @@ class FunctionVisualizerApp:
 
     def on_reset_plot(self):
         """Reset the plot and input fields."""
+        self.cancel_export()
         # Clear input fields
         self.entry_func.delete(0, "end")
         self.entry_xmin.delete(0, "end")
@@ -513,45 +512,11 @@ class FunctionVisualizerApp:
         if not receipt_path:
             return
         
-        temp_path = None
-
         try:
-            # Create receipt image
-            receipt_width, receipt_height = 600, 630
-            image = Image.new('RGB', (receipt_width, receipt_height), 'white')
-            draw = ImageDraw.Draw(image)
-            
-            # Try to load a better font, fall back to default if not available
-            try:
-                font_title = ImageFont.truetype("arial", 24)
-                font_text = ImageFont.truetype("arial", 16)
-            except:
-                font_title = ImageFont.load_default()
-                font_text = ImageFont.load_default()
-            
-            # Add header
-            draw.text((30, 30), "Function Visualizer Receipt", fill="black", font=font_title)
-            draw.text((30, 80), f"Function: {self.current_data['expr']}", fill="black", font=font_text)
-            draw.text((30, 110), f"X Range: [{self.current_data['x_range'][0]}, {self.current_data['x_range'][1]}]", 
-                    fill="black", font=font_text)
-            draw.text((30, 140), f"Derivative Order: {self.current_data['order']}", fill="black", font=font_text)
-            draw.text((30, 170), f"Date: {np.datetime64('today')}", fill="black", font=font_text)
-            
-            # temp file
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                temp_path = temp_file.name
-                self.fig.savefig(temp_path, dpi=150, bbox_inches='tight')
-            
-            # graph to receipt
-            graph_img = Image.open(temp_path)
-            graph_img = graph_img.resize((520, 380), Image.LANCZOS)
-            image.paste(graph_img, (40, 200))
-            
-            # Footer
-            footer_text = "Thank you for using DerivaPlot"
-
-            draw.text((30, 600), footer_text, fill="black", font=font_text)
-
+            # The graph is drawn straight at its size on the receipt; nothing goes through a file
+            graph = figure_image(self.fig, size=RECEIPT_GRAPH_BOX[2:])
+            image = receipt_image(graph, self.current_data['expr'], self.current_data['x_range'],
+                                  self.current_data['order'])
             
             # Save receipt
             image.save(receipt_path)
@@ -561,77 +526,123 @@ class FunctionVisualizerApp:
             
         except Exception as e:
             messagebox.showerror("Save Error", f"Error saving receipt: {e}")
-        finally:
-            # temp file cleannerr
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
 
     def on_save_csv(self):
-        """Save numerical data to CSV for further analysis."""
+        """Export the plotted values to CSV (or cancel the running export)."""
+        if self.export_job is not None:
+            self.cancel_export()
+            self.status_var.set("Export cancelled")
+            return
         if self.fig is None or not hasattr(self, 'current_data'):
             messagebox.showerror("Error", "No data to export")
             return
-            
+        self.show_csv_options()
+
+    def show_csv_options(self):
+        """Ask for the precision, delimiter and header of the export, then for the file."""
+        options_window = ctk.CTkToplevel(self.root)
+        options_window.title("Export CSV")
+        options_window.geometry("300x200")
+
+        screen_width = self.root.winfo_screenwidth()
+        screen_height = self.root.winfo_screenheight()
+        x = (screen_width - 300) // 2
+        y = (screen_height - 200) // 2
+        options_window.geometry(f'300x200+{x}+{y}')
+
+        options_window.grab_set()
+
+        options_frame = ctk.CTkFrame(options_window)
+        options_frame.pack(fill="both", expand=True, padx=10, pady=10)
+
+        precision_row = ctk.CTkFrame(options_frame)
+        precision_row.pack(fill="x", pady=3)
+        ctk.CTkLabel(precision_row, text="Digits:", width=80).pack(side="left", padx=5)
+        precision_var = ctk.StringVar(value=str(self.csv_options["precision"]))
+        ctk.CTkOptionMenu(precision_row, values=[str(digits) for digits in PRECISIONS],
+                          variable=precision_var, width=120).pack(side="left", padx=5)
+
+        delimiter_row = ctk.CTkFrame(options_frame)
+        delimiter_row.pack(fill="x", pady=3)
+        ctk.CTkLabel(delimiter_row, text="Delimiter:", width=80).pack(side="left", padx=5)
+        delimiter_var = ctk.StringVar(value=self.csv_options["delimiter"])
+        ctk.CTkOptionMenu(delimiter_row, values=list(DELIMITERS), variable=delimiter_var,
+                          width=120).pack(side="left", padx=5)
+
+        header_var = ctk.BooleanVar(value=self.csv_options["header"])
+        ctk.CTkCheckBox(options_frame, text="Column names in the first row",
+                        variable=header_var).pack(anchor="w", padx=10, pady=5)
+
+        def on_export():
+            self.csv_options = {"precision": int(precision_var.get()), "delimiter": delimiter_var.get(),
+                                "header": bool(header_var.get())}
+            options_window.destroy()
+            self.start_csv_export()
+
+        ctk.CTkButton(options_frame, text="Export", command=on_export, width=120).pack(pady=5)
+
+    def start_csv_export(self):
+        """Write the arrays the plot computed on a worker thread (nothing is recomputed)."""
+        extension = ".tsv" if self.csv_options["delimiter"] == "Tab" else ".csv"
         csv_path = filedialog.asksaveasfilename(
-            defaultextension=".csv", 
-            filetypes=[("CSV files", "*.csv")]
+            defaultextension=extension, 
+            filetypes=[("CSV files", "*.csv"), ("Tab-separated files", "*.tsv")]
         )
         
         if not csv_path:
             return
-        
+
+        header = None
+        if self.csv_options["header"]:
+            header = ['x_value', 
+                      f'function_{self.current_data["expr"]}', 
+                      f'derivative_order_{self.current_data["order"]}', 
+                      'integral']
+        columns = [self.current_data['x_vals'], *self.current_data['curves']]
+
+        job = ComputeJob()
+        future = self.executor.submit(job.run, write_csv, csv_path, columns, header,
+                                      self.csv_options["precision"], DELIMITERS[self.csv_options["delimiter"]])
+        self.export_job = job
+        self.btn_csv.configure(text="Cancel Export")
+        self.status_var.set("Exporting data to CSV...")
+        self.root.after(self.poll_delay, lambda: self.poll_export(job, future, csv_path))
+
+    def poll_export(self, job, future, csv_path):
+        """Show the export's progress until it is written."""
+        if job is not self.export_job:
+            return
+        if not future.done():
+            self.status_var.set(f"Exporting data to CSV... ({job.fraction:.0%})")
+            self.root.after(self.poll_delay, lambda: self.poll_export(job, future, csv_path))
+            return
+
+        self.export_job = None
+        self.btn_csv.configure(text="Export CSV")
         try:
-            self.status_var.set("Exporting data to CSV...")
-            self.root.update()
-            
-            # Generate x values
-            x_min, x_max = self.current_data['x_range']
-            x_vals = np.linspace(x_min, x_max, 400)
-            
-            # Get the function
-            x = sp.symbols('x')
-            sympy_expr = sp.sympify(self.current_data['expr'], locals={"sin": sp.sin, "cos": sp.cos, 
-                                            "tan": sp.tan, "exp": sp.exp, "log": sp.log, 
-                                            "sqrt": sp.sqrt, "pi": sp.pi, "e": sp.E})
-            f = sp.lambdify(x, sympy_expr, 'numpy')
-            
-            # Calculate function values
-            y_vals = f(x_vals)
-            
-            # Calculate derivatives
-            derivative_vals = self.numerical_derivative(f, x_vals, self.current_data['order'])
-            
-            # Calculate integral
-            integral_vals = self.numerical_integral(f, x_vals)
-            
-            # Export to CSV
-            with open(csv_path, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                
-                # Write header
-                header = ['x_value', 
-                        f'function_{self.current_data["expr"]}', 
-                        f'derivative_order_{self.current_data["order"]}', 
-                        'integral']
-                writer.writerow(header)
-                
-                # Write data rows
-                for i in range(len(x_vals)):
-                    writer.writerow([
-                        x_vals[i], 
-                        y_vals[i], 
-                        derivative_vals[i], 
-                        integral_vals[i]
-                    ])
-            self.status_var.set(f"Data exported to {os.path.basename(csv_path)}")
-            messagebox.showinfo("Success", f"Data exported successfully to:\n{csv_path}")
-        
+            future.result()
+        except Cancelled:
+            self.status_var.set("Export cancelled")
+            return
         except Exception as e:
             messagebox.showerror("Export Error", f"Error exporting data: {e}")
-            self.status_var.set("Error exporting data")        
+            self.status_var.set("Error exporting data")
+            return
+        self.status_var.set(f"Data exported to {os.path.basename(csv_path)}")
+        messagebox.showinfo("Success", f"Data exported successfully to:\n{csv_path}")
+
+    def cancel_export(self):
+        """Stop the running export; the partial file is removed."""
+        if self.export_job is None:
+            return
+        self.export_job.cancel()
+        self.export_job = None
+        self.btn_csv.configure(text="Export CSV")
     
     def on_closing(self):
         """Handle window closing."""
+        self.cancel_export()
+        self.executor.shutdown(wait=False, cancel_futures=True)
         plt.close('all')  # Close all matplotlib
         self.root.destroy()
 
@@ -642,4 +653,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Lets frozen builds start the expression guard's worker process
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file